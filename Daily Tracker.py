@@ -1,13 +1,19 @@
 import datetime
-from collections import defaultdict
 
 import pandas as pd
 import pytz
 import streamlit as st
-from supabase import create_client
 from postgrest.exceptions import APIError
 from streamlit_sortables import sort_items
 
+from changes import changes
+from datasets import fetch_frame, typed
+from db import get_supabase
+from progress import record_crew_days
+from roster import invalidate_roster, load_roster
+from session_store import session_date_dataset, sticky_date_input
+from write_queue import DAILY_LOGS, get_write_queue, next_submission, render_sync_status, submission_key
+
 st.set_page_config(page_title="Daily Crew Tracker", layout="wide")
 st.title("📅 Daily Tracker")
 
@@ -16,296 +22,284 @@ LOCAL_TZ = pytz.timezone("US/Central")
 local_today = datetime.datetime.now(LOCAL_TZ).date()
 
 # ---- Supabase ----
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_supabase()
+
+DAY_TYPES = ["none", "full", "half"]
+LAST_ROLE_LOOKBACK_DAYS = 60  # how far back to look for a worker's last-used role
+DAILY_LOG_COLUMNS = ["id", "employee_role_id", "day_type", "date"]
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
 # ---------------------------
-# Helpers: load & sort people
+# Helpers
 # ---------------------------
-def load_employee_roles(client):
-    """Return rows from employee_roles with normalized sort_order and sane fallback ordering."""
-    rows = []
-    try:
-        rows = (
-            client.table("employee_roles")
-            .select("id,name,role,daily_rate,sort_order")
-            .order("sort_order", desc=False)
-            .execute()
-        ).data or []
-    except Exception:
-        try:
-            rows = (
-                client.table("employee_roles")
-                .select("id,name,role,daily_rate,sort_order")
-                .execute()
-            ).data or []
-            st.info("Could not order by sort_order in DB; ordering locally.")
-        except Exception:
-            rows = (
-                client.table("employee_roles")
-                .select("id,name,role,daily_rate")
-                .execute()
-            ).data or []
-
-    # normalize and local sort fallback (by per-row sort_order then name)
-    for r in rows:
-        try:
-            r["sort_order"] = int(r.get("sort_order")) if r.get("sort_order") is not None else 9999
-        except (TypeError, ValueError):
-            r["sort_order"] = 9999
-    rows.sort(key=lambda r: (r["sort_order"], r["name"]))
-    return rows
-
-def compute_name_sort_map(grouped_roles):
-    """Map each name -> the minimum sort_order across that name's roles."""
-    name_sort_map = {}
-    for name, rows in grouped_roles.items():
-        min_so = min((r.get("sort_order") if r.get("sort_order") is not None else 9999) for r in rows)
-        name_sort_map[name] = min_so
-    return name_sort_map
-
-def get_next_sort_order(name_sort_map):
-    """Return max(sort_order)+1, or 1 if empty."""
-    return (max(name_sort_map.values()) + 1) if name_sort_map else 1
-
-def upsert_daily_log_with_company_fallback(payload: dict):
+def expand_date_range(date_value, weekdays=None):
     """
-    Try to upsert daily_logs without company_id.
-    If Postgres returns 23502 (NOT NULL) mentioning company_id,
-    retry by inferring a company_id from any existing daily_logs row.
+    Turn a date_input value (date, or 1-2 item tuple) into a list of dates.
+    If `weekdays` (indexes 0=Mon..6=Sun) is given, keep only those days.
     """
-    try:
-        supabase.table("daily_logs").upsert(
-            payload, on_conflict="employee_role_id,date"
-        ).execute()
-        return True, None
-    except APIError as e:
-        err = e.args[0] if e.args and isinstance(e.args[0], dict) else {"message": str(e)}
-        msg = (err.get("message") or "").lower()
-        code = err.get("code")
-        if code == "23502" and "company_id" in msg:
-            # Try to infer a company_id from existing rows
-            try:
-                existing = (
-                    supabase.table("daily_logs")
-                    .select("company_id")
-                    .not_.is_("company_id", "null")
-                    .limit(1)
-                    .execute()
-                ).data or []
-            except Exception:
-                existing = []
-            if existing and existing[0].get("company_id") is not None:
-                payload2 = {**payload, "company_id": existing[0]["company_id"]}
-                # Retry with inferred company_id
-                supabase.table("daily_logs").upsert(
-                    payload2, on_conflict="employee_role_id,date"
-                ).execute()
-                return True, None
-            else:
-                # No value to infer; instruct how to fix DB schema
-                fix = (
-                    "Your daily_logs table still requires company_id. "
-                    "Either drop NOT NULL:\n"
-                    "  ALTER TABLE daily_logs ALTER COLUMN company_id DROP NOT NULL;\n"
-                    "or drop the column:\n"
-                    "  ALTER TABLE daily_logs DROP COLUMN company_id;\n"
-                    "Then reload this page."
-                )
-                return False, {"shown": err, "howto": fix}
-        # Any other error
-        return False, {"shown": err, "howto": None}
-
-# initial load
-employee_roles = load_employee_roles(supabase)
-
-# ---- Group roles by name ----
-from collections import defaultdict as _dd
-grouped_roles = _dd(list)
-for entry in employee_roles:
-    grouped_roles[entry["name"]].append(entry)
+    if isinstance(date_value, (tuple, list)):
+        if not date_value:
+            return []
+        start, end = date_value[0], date_value[-1]
+    else:
+        start = end = date_value
+    days = [start + datetime.timedelta(days=i) for i in range((end - start).days + 1)]
+    if weekdays:
+        days = [d for d in days if d.weekday() in weekdays]
+    return days
+
+def fetch_daily_logs(client, start_date, end_date):
+    """daily_logs rows dated within [start_date, end_date]."""
+    frame = fetch_frame(lambda: (
+        client.table("daily_logs")
+        .select(",".join(DAILY_LOG_COLUMNS))
+        .gte("date", start_date.isoformat())
+        .lte("date", end_date.isoformat())
+        .order("id", desc=False)
+    ), DAILY_LOG_COLUMNS)
+    return typed(frame, dates=["date"])
+
+def load_compact_entry_rows(roster, for_date, logs):
+    """
+    One row per name for the compact entry table, from `logs` (the daily_logs of
+    the LAST_ROLE_LOOKBACK_DAYS up to `for_date`).
+    Prefill role/day type from that date's daily_logs; otherwise use the
+    name's most recently logged role (or its first role) with day type "none".
+    """
+    day = pd.Timestamp(for_date)
+    day_logs = logs[logs["date"] == day].to_dict("records")
+    recent_logs = logs[logs["date"] < day].sort_values("date", ascending=False, kind="stable").to_dict("records")
+
+    logged = {}
+    for log in day_logs:
+        role_row = roster.by_id.get(log["employee_role_id"])
+        if role_row:
+            logged[role_row.name] = (role_row.role, log["day_type"])
+
+    last_role = {}
+    for log in recent_logs:  # newest first, so keep the first hit per name
+        role_row = roster.by_id.get(log["employee_role_id"])
+        if role_row:
+            last_role.setdefault(role_row.name, role_row.role)
 
-# ---- ORDER NAMES BY THEIR sort_order (not alphabetically) ----
-name_sort_map = compute_name_sort_map(grouped_roles)
-all_names = [name for name, _ in sorted(name_sort_map.items(), key=lambda x: x[1])]
+    rows = []
+    for name in roster.names:
+        if name in logged:
+            role, day_type = logged[name]
+        else:
+            role = last_role.get(name, roster.primary_role(name).role)
+            day_type = "none"
+        if day_type not in DAY_TYPES:
+            day_type = "none"
+        rows.append({"Name": name, "Role": role, "Day Type": day_type})
+    return pd.DataFrame(rows, columns=["Name", "Role", "Day Type"])
+
+# initial load: shared, indexed roster (names ordered by sort_order, not alphabetically)
+roster = load_roster(supabase)
+write_queue = get_write_queue(supabase)
+render_sync_status(write_queue)
 
 # ---------------------------
 # Date picker
 # ---------------------------
-selected_date = st.date_input("📆 Select Date", local_today)
+# kept in the session store so it survives switching pages
+selected_date = sticky_date_input("📆 Select Date", "working_date", local_today)
 
 # ------------------------------------------------------
 # 1) Enter today's logs for each worker (bulk save form)
 # ------------------------------------------------------
 st.header("📝 Enter Today’s Logs")
 
+# Compact mode renders one table widget instead of four widgets per person,
+# so the widget count stays constant as the roster grows.
+entry_mode = st.radio(
+    "Entry mode",
+    ["Per person", "Compact table"],
+    key="today_entry_mode",
+    horizontal=True,
+)
+
+# One session-held window of daily_logs serves every section below; the compact
+# table also needs the lookback days for each person's last-used role.
+lookback = LAST_ROLE_LOOKBACK_DAYS if entry_mode == "Compact table" else 0
+daily_logs = session_date_dataset(
+    "daily_logs", ("daily_logs",),
+    selected_date - datetime.timedelta(days=lookback), selected_date,
+    lambda start, end: fetch_daily_logs(supabase, start, end), "date",
+)
+day_logs = daily_logs[daily_logs["date"] == pd.Timestamp(selected_date)].to_dict("records")
+
 with st.form("today_logs_form"):
     tech_data = {}
 
-    # Single column to preserve order on phones (no wrapping)
-    for name in all_names:
-        with st.container():
-            st.subheader(name)
-            roles_for_name = [r["role"] for r in grouped_roles[name]]
-            selected_role = st.selectbox(
-                "",  # compact label
-                roles_for_name,
-                key=f"{name}_role"
-            )
-            day_type = st.radio(
-                "Day type",
-                ["none", "full", "half"],
-                key=f"{name}_daytype",
-                horizontal=True
-            )
-            tech_data[name] = {"selected_role": selected_role, "day_type": day_type}
-            st.divider()
+    if entry_mode == "Compact table":
+        compact_rows = load_compact_entry_rows(roster, selected_date, daily_logs)
+        edited_rows = st.data_editor(
+            compact_rows,
+            key=f"compact_logs_{selected_date.isoformat()}",
+            hide_index=True,
+            num_rows="fixed",
+            use_container_width=True,
+            disabled=["Name"],
+            column_config={
+                "Role": st.column_config.SelectboxColumn(
+                    "Role",
+                    options=roster.distinct_roles,
+                    required=True,
+                ),
+                "Day Type": st.column_config.SelectboxColumn(
+                    "Day Type", options=DAY_TYPES, required=True
+                ),
+            },
+        )
+        for row in edited_rows.to_dict("records"):
+            tech_data[row["Name"]] = {"selected_role": row["Role"], "day_type": row["Day Type"]}
+    else:
+        # Single column to preserve order on phones (no wrapping)
+        for name in roster.names:
+            with st.container():
+                st.subheader(name)
+                roles_for_name = roster.roles_for(name)
+                selected_role = st.selectbox(
+                    "",  # compact label
+                    roles_for_name,
+                    key=f"{name}_role"
+                )
+                day_type = st.radio(
+                    "Day type",
+                    DAY_TYPES,
+                    key=f"{name}_daytype",
+                    horizontal=True
+                )
+                tech_data[name] = {"selected_role": selected_role, "day_type": day_type}
+                st.divider()
 
     submitted = st.form_submit_button("✅ Save Today's Logs")
 
     if submitted:
-        entries_upserted = 0
-        try:
-            for name, data in tech_data.items():
-                if data["day_type"] == "none":
-                    continue
-
-                matching = next(
-                    (r for r in grouped_roles[name] if r["role"] == data["selected_role"]),
-                    None
-                )
-                if not matching:
-                    continue
-
-                payload = {
-                    "employee_role_id": matching["id"],
-                    "date": selected_date.isoformat(),
-                    "day_type": data["day_type"],
-                }
-
-                ok, errinfo = upsert_daily_log_with_company_fallback(payload)
-                if not ok:
-                    err = errinfo["shown"]
-                    st.error(f"Supabase error: {err.get('message')}")
-                    if err.get("details"):
-                        st.info(err["details"])
-                    if err.get("hint"):
-                        st.caption(err["hint"])
-                    if errinfo.get("howto"):
-                        st.warning(errinfo["howto"])
-                    st.stop()
-                entries_upserted += 1
-
-            st.success(f"✅ {entries_upserted} logs saved for {selected_date}")
-        except APIError as e:
-            err = e.args[0] if e.args and isinstance(e.args[0], dict) else {"message": str(e)}
-            st.error(f"Supabase error: {err.get('message')}")
-            if err.get("details"):
-                st.info(err["details"])
-            if err.get("hint"):
-                st.caption(err["hint"])
-            raise
+        payloads = []
+        skipped = []
+        for name, data in tech_data.items():
+            if data["day_type"] == "none":
+                continue
+
+            matching = roster.by_name_role.get((name, data["selected_role"]))
+            if not matching:
+                # Compact mode offers every role; skip ones this person doesn't hold
+                skipped.append(f"{name} ({data['selected_role']})")
+                continue
+
+            payloads.append({
+                "employee_role_id": matching.id,
+                "date": selected_date.isoformat(),
+                "day_type": data["day_type"],
+            })
+
+        # Saved to the local write queue right away; the flusher syncs it to Supabase
+        queued = True
+        if payloads:
+            queued = write_queue.enqueue(DAILY_LOGS, payloads, key=submission_key(DAILY_LOGS, "today_logs_form"))
+            next_submission("today_logs_form")
+        if queued:
+            st.success(f"✅ {len(payloads)} logs saved for {selected_date}")
+        else:
+            st.info("These logs are already waiting to sync; they won't be saved twice.")
+        if skipped:
+            st.warning("Skipped (role not assigned to worker): " + ", ".join(skipped))
 
 # -------------------------------------
 # 2) Manual add of logs for any date(s)
 # -------------------------------------
 st.header("🧩 Add Log(s) Manually")
 
-# Build role lists for multiselect convenience
-name_to_roles = {
-    name: sorted(set(row["role"] for row in rows))
-    for name, rows in grouped_roles.items()
-}
-distinct_roles = sorted(set(r["role"] for r in employee_roles))
-
 with st.form("manual_entry_form"):
-    manual_date = st.date_input("📅 Date for Manual Entry", local_today, key="manual_date")
-    selected_names = st.multiselect("Select Worker(s)", all_names)
+    manual_dates = st.date_input(
+        "📅 Date(s) for Manual Entry (pick a start and end date for a range)",
+        (local_today, local_today),
+        key="manual_date",
+    )
+    manual_weekdays = st.multiselect(
+        "Only on these weekdays (leave empty for every day)", WEEKDAY_NAMES, key="manual_weekdays"
+    )
+    selected_names = st.multiselect("Select Worker(s)", roster.names)
 
     possible_roles = (
-        sorted(set(role for n in selected_names for role in name_to_roles.get(n, [])))
-        if selected_names else distinct_roles
+        sorted(set(role for n in selected_names for role in roster.roles_for(n)))
+        if selected_names else roster.distinct_roles
     )
     selected_role = st.selectbox("Select Role", possible_roles)
     selected_day_type = st.radio("Work Duration", ["full", "half"], horizontal=True)
     manual_submit = st.form_submit_button("➕ Add Log(s)")
 
     if manual_submit:
-        try:
-            added = 0
-            for name in selected_names:
-                role_row = next(
-                    (r for r in employee_roles if r["name"] == name and r["role"] == selected_role),
-                    None
-                )
-                if not role_row:
-                    continue
+        dates = expand_date_range(
+            manual_dates, {WEEKDAY_NAMES.index(d) for d in manual_weekdays}
+        )
 
-                payload = {
-                    "employee_role_id": role_row["id"],
-                    "date": manual_date.isoformat(),
+        # Build the worker x date matrix against the (name, role) index
+        payloads = []
+        for name in selected_names:
+            role_row = roster.by_name_role.get((name, selected_role))
+            if not role_row:
+                continue
+            for day in dates:
+                payloads.append({
+                    "employee_role_id": role_row.id,
+                    "date": day.isoformat(),
                     "day_type": selected_day_type,
-                }
-
-                ok, errinfo = upsert_daily_log_with_company_fallback(payload)
-                if not ok:
-                    err = errinfo["shown"]
-                    st.error(f"Supabase error: {err.get('message')}")
-                    if err.get("details"):
-                        st.info(err["details"])
-                    if err.get("hint"):
-                        st.caption(err["hint"])
-                    if errinfo.get("howto"):
-                        st.warning(errinfo["howto"])
-                    st.stop()
-
-                added += 1
-
-            st.success(f"✅ {added} manual log(s) added.")
-            st.rerun()
-        except APIError as e:
-            err = e.args[0] if e.args and isinstance(e.args[0], dict) else {"message": str(e)}
-            st.error(f"Supabase error: {err.get('message')}")
-            if err.get("details"):
-                st.info(err["details"])
-            if err.get("hint"):
-                st.caption(err["hint"])
-            raise
+                })
+
+        if not payloads:
+            st.warning("Nothing to add: no matching worker/role or no dates in range.")
+            st.stop()
+
+        # Queued like the form above, so a backfill and today's entries sync in the order
+        # they were saved; the flusher writes it in chunked bulk upserts
+        if write_queue.enqueue(DAILY_LOGS, payloads, key=submission_key(DAILY_LOGS, "manual_entry_form")):
+            st.success(f"✅ {len(payloads)} manual log(s) saved.")
+            st.session_state.backfill_dates = sorted({row["date"] for row in payloads})
+        else:
+            st.info("These logs are already waiting to sync; they won't be saved twice.")
+        next_submission("manual_entry_form")
+
+# Sync progress of the last backfill: its dates leave pending_dates() as the flusher writes them
+backfill_dates = st.session_state.get("backfill_dates")
+if backfill_dates:
+    still_pending = write_queue.pending_dates().intersection(backfill_dates)
+    synced = len(backfill_dates) - len(still_pending)
+    if still_pending:
+        st.progress(
+            synced / len(backfill_dates),
+            text=f"🔄 Backfill syncing: {synced} of {len(backfill_dates)} day(s) written",
+        )
+    else:
+        st.caption(f"✅ Backfill synced ({len(backfill_dates)} day(s)).")
+        del st.session_state.backfill_dates
 
 # -------------------------
 # 3) Update / Delete Day Logs
 # -------------------------
 with st.expander("✏️ Update / Delete Logs"):
-    all_logs = (
-        supabase.table("daily_logs")
-        .select("id,employee_role_id,day_type,date")
-        .eq("date", selected_date.isoformat())
-        .execute()
-    ).data or []
-
-    # Build a mapping for quick name/role lookup
-    role_map = {r["id"]: r for r in employee_roles}
     display_rows = []
-    for log in all_logs:
-        role_row = role_map.get(log["employee_role_id"])
+    for log in day_logs:
+        role_row = roster.by_id.get(log["employee_role_id"])
         if not role_row:
             continue
         display_rows.append(
             {
                 "id": log["id"],
-                "name": role_row["name"],
-                "role": role_row["role"],
+                "employee_role_id": log["employee_role_id"],
+                "name": role_row.name,
+                "role": role_row.role,
                 "day_type": log["day_type"],
-                "sort_order": role_row.get("sort_order", 9999),
             }
         )
 
     # ORDER the update list by the same person-level sort
-    display_rows.sort(key=lambda x: (name_sort_map.get(x["name"], 9999), x["name"], x["role"]))
+    display_rows.sort(key=lambda x: roster.sort_key(x["name"], x["role"]))
 
     if display_rows:
-        df = pd.DataFrame([{k: v for k, v in row.items() if k != "sort_order"} for row in display_rows])
+        df = pd.DataFrame(display_rows)
         st.dataframe(df, hide_index=True, use_container_width=True)
 
         # Simple per-row editor
@@ -322,27 +316,29 @@ with st.expander("✏️ Update / Delete Logs"):
                 )
             with col3:
                 if st.button("Update", key=f"btn_upd_{row['id']}"):
-                    try:
-                        supabase.table("daily_logs").update(
-                            {"day_type": new_day}
-                        ).eq("id", row["id"]).execute()
-                        st.success("Updated.")
-                        st.rerun()
-                    except APIError as e:
-                        err = e.args[0] if e.args and isinstance(e.args[0], dict) else {"message": str(e)}
-                        st.error(f"Supabase error: {err.get('message')}")
-                        if err.get("details"):
-                            st.info(err["details"])
-                        if err.get("hint"):
-                            st.caption(err["hint"])
+                    # an upsert on (employee_role_id, date), queued behind any earlier saves
+                    form = f"upd_{row['id']}"
+                    write_queue.enqueue(DAILY_LOGS, [{
+                        "employee_role_id": int(row["employee_role_id"]),
+                        "date": selected_date.isoformat(),
+                        "day_type": new_day,
+                    }], key=submission_key(DAILY_LOGS, form))
+                    next_submission(form)
+                    st.success("Updated.")
 
         st.divider()
+        # Deletes go straight to Supabase; a queued save for the same day would land
+        # after them and bring the row back, so they wait until the queue has synced
+        syncing = selected_date.isoformat() in write_queue.pending_dates()
+        if syncing:
+            st.caption("🔄 Logs for this date are still syncing; deleting is available once they're saved.")
         for row in display_rows:
-            if st.button(f"🗑️ Delete {row['name']} ({row['role']})", key=f"btn_del_{row['id']}"):
+            if st.button(
+                f"🗑️ Delete {row['name']} ({row['role']})", key=f"btn_del_{row['id']}", disabled=syncing
+            ):
                 try:
                     supabase.table("daily_logs").delete().eq("id", row["id"]).execute()
-                    st.success("Deleted.")
-                    st.rerun()
+                    changes.bump("daily_logs", [selected_date])
                 except APIError as e:
                     err = e.args[0] if e.args and isinstance(e.args[0], dict) else {"message": str(e)}
                     st.error(f"Supabase error: {err.get('message')}")
@@ -350,6 +346,20 @@ with st.expander("✏️ Update / Delete Logs"):
                         st.info(err["details"])
                     if err.get("hint"):
                         st.caption(err["hint"])
+                else:
+                    # production logs that counted this day's pay lose it
+                    deleted = {"employee_role_id": int(row["employee_role_id"]),
+                               "date": selected_date.isoformat(), "day_type": row["day_type"]}
+                    try:
+                        record_crew_days(supabase, [deleted], [])
+                    except Exception as e:
+                        st.warning(
+                            f"Log deleted, but PSA progress wasn't updated ({e}); "
+                            "`python rollups.py --once --rebuild-progress` recounts it."
+                        )
+                    else:
+                        st.success("Deleted.")
+                        st.rerun()
     else:
         st.info("No logs available to update or delete for this date.")
 
@@ -371,10 +381,10 @@ with st.expander("➕ Add Worker / Role"):
             else:
                 try:
                     # If name exists, inherit that name's sort_order; else append to bottom
-                    if new_name in name_sort_map:
-                        sort_for_name = name_sort_map[new_name]
+                    if new_name in roster.name_sort_map:
+                        sort_for_name = roster.name_sort_map[new_name]
                     else:
-                        sort_for_name = get_next_sort_order(name_sort_map)
+                        sort_for_name = roster.next_sort_order()
 
                     payload = {
                         "name": new_name,
@@ -383,6 +393,7 @@ with st.expander("➕ Add Worker / Role"):
                         "sort_order": sort_for_name,
                     }
                     res = supabase.table("employee_roles").insert(payload).execute()
+                    invalidate_roster()
                     if isinstance(res.data, list) and res.data:
                         st.success(f"Added {new_name} ({new_role}).")
                     else:
@@ -401,10 +412,9 @@ with st.expander("➕ Add Worker / Role"):
 
 with st.expander("🗑️ Delete Worker / Role"):
     # Build choices for easy selection
-    name_choices = [n for n in all_names]
+    name_choices = roster.names
     # Flatten rows for specific-role deletion
-    role_rows_display = [f"{r['name']} — {r['role']} (id={r['id']})" for r in employee_roles]
-    id_by_display = {f"{r['name']} — {r['role']} (id={r['id']})": r["id"] for r in employee_roles}
+    role_row_ids = [r.id for r in roster.records]
 
     tab_by_name, tab_by_row = st.tabs(["Delete All Roles by Name", "Delete Specific Role Row"])
 
@@ -415,6 +425,7 @@ with st.expander("🗑️ Delete Worker / Role"):
             if del_btn and del_name:
                 try:
                     supabase.table("employee_roles").delete().eq("name", del_name).execute()
+                    invalidate_roster()
                     st.success(f"Deleted all roles for {del_name}.")
                     st.rerun()
                 except APIError as e:
@@ -427,12 +438,14 @@ with st.expander("🗑️ Delete Worker / Role"):
 
     with tab_by_row:
         with st.form("del_by_row_form"):
-            del_row_display = st.selectbox("Select Role Row", role_rows_display) if role_rows_display else ""
+            del_id = st.selectbox(
+                "Select Role Row", role_row_ids, format_func=lambda i: roster.by_id[i].label
+            ) if role_row_ids else None
             del_row_btn = st.form_submit_button("Delete Selected Role Row")
-            if del_row_btn and del_row_display:
+            if del_row_btn and del_id is not None:
                 try:
-                    del_id = id_by_display[del_row_display]
                     supabase.table("employee_roles").delete().eq("id", del_id).execute()
+                    invalidate_roster()
                     st.success("Deleted the selected role row.")
                     st.rerun()
                 except APIError as e:
@@ -447,9 +460,8 @@ with st.expander("🗑️ Delete Worker / Role"):
 # 5) Drag-to-sort employees by NAME
 # -----------------------------------
 with st.expander("🔀 Sort Employee Display Order (by Name)"):
-    sorted_names_only = [name for name, _ in sorted(name_sort_map.items(), key=lambda x: x[1])]
     if "drag_order" not in st.session_state:
-        st.session_state.drag_order = sorted_names_only
+        st.session_state.drag_order = list(roster.names)
 
     new_order = sort_items(st.session_state.drag_order, direction="vertical", key="employee_sort")
 
@@ -458,6 +470,7 @@ with st.expander("🔀 Sort Employee Display Order (by Name)"):
             for idx, name in enumerate(new_order, start=1):  # 1-based order
                 # IMPORTANT: update ALL rows for that name to keep same sort across roles
                 supabase.table("employee_roles").update({"sort_order": idx}).eq("name", name).execute()
+            invalidate_roster()
             st.session_state.drag_order = new_order
             st.success("✅ Sort order updated.")
             st.rerun()
@@ -473,33 +486,24 @@ with st.expander("🔀 Sort Employee Display Order (by Name)"):
 # Show the day
 # -------------
 st.header("📋 Today's Work Log")
-logs = (
-    supabase.table("daily_logs")
-    .select("id,employee_role_id,day_type,date")
-    .eq("date", selected_date.isoformat())
-    .execute()
-).data
-
-role_map = {r["id"]: r for r in employee_roles}
 rows = []
-for log in (logs or []):
-    role_row = role_map.get(log["employee_role_id"])
+for log in day_logs:
+    role_row = roster.by_id.get(log["employee_role_id"])
     if role_row:
         rows.append(
             {
-                "Name": role_row["name"],
-                "Role": role_row["role"],
+                "Name": role_row.name,
+                "Role": role_row.role,
                 "Day Type": log["day_type"],
-                "Date": log["date"],
-                "sort_order": role_row.get("sort_order", 9999),
+                "Date": log["date"].date().isoformat(),
             }
         )
 
 # ORDER the display by person-level sort
-rows.sort(key=lambda x: (name_sort_map.get(x["Name"], 9999), x["Name"], x["Role"]))
+rows.sort(key=lambda x: roster.sort_key(x["Name"], x["Role"]))
 
 if rows:
-    df = pd.DataFrame([{k: v for k, v in r.items() if k != "sort_order"} for r in rows])
+    df = pd.DataFrame(rows)
     st.dataframe(df, hide_index=True, use_container_width=True)
 else:
     st.info("No entries yet for the selected date.")
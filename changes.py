@@ -0,0 +1,61 @@
+import datetime
+import itertools
+import threading
+from collections import deque
+
+CHANGE_HISTORY = 500  # changes remembered per table; older versions reload from scratch
+
+
+class ChangeRegistry:
+    """
+    Process-wide record of writes this server made: a version per table, plus which
+    dates each write touched so date-keyed readers can refetch just those days.
+    """
+
+    def __init__(self, history=CHANGE_HISTORY):
+        self.lock = threading.Lock()
+        self.history = history
+        self.counter = itertools.count(1)
+        self.versions = {}  # table -> latest version
+        self.changes = {}  # table -> deque of (version, frozenset of ISO dates, or None for "anything")
+        self.forgotten = {}  # table -> newest version dropped from `changes`
+
+    def bump(self, table, dates=None):
+        """Record a write to `table`; `dates` narrows it to those days (None: the whole table)."""
+        if dates is not None:
+            dates = frozenset(d.isoformat() if isinstance(d, datetime.date) else str(d)[:10] for d in dates)
+        with self.lock:
+            version = next(self.counter)
+            log = self.changes.setdefault(table, deque())
+            if len(log) >= self.history:
+                self.forgotten[table] = log.popleft()[0]
+            log.append((version, dates))
+            self.versions[table] = version
+        return version
+
+    def version(self, tables):
+        """Current version stamp for one or more tables."""
+        with self.lock:
+            return tuple(self.versions.get(t, 0) for t in tables)
+
+    def changed_dates(self, tables, since):
+        """
+        ISO dates written in `tables` after the `since` stamp (from version()), or
+        None when a write covered a whole table or is no longer remembered.
+        """
+        dates = set()
+        with self.lock:
+            for table, seen in zip(tables, since):
+                if self.forgotten.get(table, 0) > seen:
+                    return None
+                for version, touched in self.changes.get(table, ()):
+                    if version <= seen:
+                        continue
+                    if touched is None:
+                        return None
+                    dates |= touched
+        return dates
+
+
+# one registry per server process, shared by every session and the write-queue flusher
+changes = ChangeRegistry()
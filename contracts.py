@@ -0,0 +1,152 @@
+import datetime
+
+import pandas as pd
+from postgrest.exceptions import APIError
+
+from changes import changes
+from datasets import IN_FILTER_BATCH, fetch_all
+
+RATE_HISTORY_FLOOR = datetime.date(2000, 1, 1)  # effective date given to a contract's original rate
+CONTRACT_PAGE_SIZE = 50
+CONTRACT_COLUMNS = "psa_number,company_name,pay_rate,created_at"
+SEARCH_STRIP_CHARS = ',()"*%\\:'  # reserved in PostgREST or=() filters / like patterns
+MISSING_TABLE_CODES = ("42P01", "PGRST205")
+
+RATE_HISTORY_HOWTO = (
+    "Pay rate history needs the psa_rate_history table:\n"
+    "  CREATE TABLE psa_rate_history (\n"
+    "    id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,\n"
+    "    psa_number text NOT NULL,\n"
+    "    pay_rate numeric NOT NULL,\n"
+    "    effective_date date NOT NULL,\n"
+    "    created_at timestamptz NOT NULL DEFAULT now(),\n"
+    "    UNIQUE (psa_number, effective_date)\n"
+    "  );\n"
+    "Until then, saving a new rate overwrites psa_rates.pay_rate for all history."
+)
+
+
+def is_missing_table(e):
+    """True when an APIError says the table hasn't been created yet."""
+    return getattr(e, "code", None) in MISSING_TABLE_CODES
+
+
+def search_contracts(client, prefix="", after=None, page_size=CONTRACT_PAGE_SIZE):
+    """
+    One keyset page of psa_rates ordered by psa_number, filtered server-side to
+    contracts whose PSA or company starts with `prefix` (case-insensitive).
+    `after` is the last psa_number of the previous page. Returns (rows, has_more).
+    """
+    term = "".join(c for c in (prefix or "").strip() if c not in SEARCH_STRIP_CHARS)
+    query = client.table("psa_rates").select(CONTRACT_COLUMNS)
+    if term:
+        query = query.or_(f"psa_number.ilike.{term}*,company_name.ilike.{term}*")
+    if after is not None:
+        query = query.gt("psa_number", after)
+    rows = query.order("psa_number", desc=False).limit(page_size + 1).execute().data or []
+    return rows[:page_size], len(rows) > page_size
+
+
+def get_contract(client, psa_number):
+    """Point lookup of one psa_rates row, or None."""
+    rows = (
+        client.table("psa_rates")
+        .select(CONTRACT_COLUMNS)
+        .eq("psa_number", psa_number)
+        .limit(1)
+        .execute()
+    ).data or []
+    return rows[0] if rows else None
+
+
+def load_rate_history(client, psa_numbers=None):
+    """
+    Return (history, available). `history` has psa_number, effective_date (datetime64)
+    and pay_rate columns; `available` is False when the table doesn't exist yet.
+    `psa_numbers` limits it to those contracts; None loads every contract.
+    """
+    def query(batch):
+        q = client.table("psa_rate_history").select("psa_number,effective_date,pay_rate")
+        if batch is not None:
+            q = q.in_("psa_number", batch)
+        # psa_number breaks effective_date ties so pages don't shift under .range()
+        return q.order("effective_date", desc=False).order("psa_number", desc=False)
+
+    if psa_numbers is None:
+        batches = [None]
+    else:
+        psa_numbers = sorted(set(psa_numbers))
+        batches = [psa_numbers[i:i + IN_FILTER_BATCH] for i in range(0, len(psa_numbers), IN_FILTER_BATCH)]
+    try:
+        rows = [row for batch in batches for row in fetch_all(lambda: query(batch))]
+    except APIError as e:
+        if is_missing_table(e):
+            return empty_rate_history(), False
+        raise
+
+    if not rows:
+        return empty_rate_history(), True
+    history = pd.DataFrame(rows, columns=["psa_number", "effective_date", "pay_rate"])
+    history["effective_date"] = pd.to_datetime(history["effective_date"])
+    history["pay_rate"] = history["pay_rate"].astype(float)
+    return history, True
+
+
+def has_rate_history(client):
+    """False when the psa_rate_history table doesn't exist yet."""
+    try:
+        client.table("psa_rate_history").select("id").limit(1).execute()
+    except APIError as e:
+        if is_missing_table(e):
+            return False
+        raise
+    return True
+
+
+def rates_as_of(history, day):
+    """
+    {psa_number: pay_rate} in effect on `day`, from a load_rate_history frame.
+    psa_rates.pay_rate isn't moved forward when a future-dated rate takes effect,
+    so this is what "current rate" means for contracts with history.
+    """
+    effective = history[history["effective_date"] <= pd.Timestamp(day)]
+    latest = effective.sort_values("effective_date", kind="stable").drop_duplicates("psa_number", keep="last")
+    return dict(zip(latest["psa_number"], latest["pay_rate"]))
+
+
+def empty_rate_history():
+    return pd.DataFrame({
+        "psa_number": pd.Series(dtype=object),
+        "effective_date": pd.Series(dtype="datetime64[ns]"),
+        "pay_rate": pd.Series(dtype=float),
+    })
+
+
+def record_rate_change(client, psa_number, old_rate, new_rate, effective_date):
+    """
+    Add an effective-dated rate for a contract.
+    The first time a contract is re-priced its original rate is seeded at
+    RATE_HISTORY_FLOOR, so footage logged before `effective_date` keeps it.
+    """
+    existing = (
+        client.table("psa_rate_history")
+        .select("id")
+        .eq("psa_number", psa_number)
+        .limit(1)
+        .execute()
+    ).data or []
+
+    rows = []
+    if not existing and effective_date > RATE_HISTORY_FLOOR:
+        rows.append({
+            "psa_number": psa_number,
+            "pay_rate": old_rate,
+            "effective_date": RATE_HISTORY_FLOOR.isoformat(),
+        })
+    rows.append({
+        "psa_number": psa_number,
+        "pay_rate": new_rate,
+        "effective_date": effective_date.isoformat(),
+    })
+    client.table("psa_rate_history").upsert(rows, on_conflict="psa_number,effective_date").execute()
+    changes.bump("psa_rate_history")
@@ -0,0 +1,75 @@
+from postgrest.exceptions import APIError
+
+from changes import changes
+
+UPSERT_CHUNK_SIZE = 500  # rows per bulk upsert request
+
+
+def upsert_daily_log_with_company_fallback(client, payload):
+    """
+    Try to upsert daily_logs without company_id.
+    `payload` is one row dict or a list of rows (sent as a single bulk upsert).
+    If Postgres returns 23502 (NOT NULL) mentioning company_id,
+    retry by inferring a company_id from any existing daily_logs row.
+    """
+    try:
+        client.table("daily_logs").upsert(
+            payload, on_conflict="employee_role_id,date"
+        ).execute()
+        return True, None
+    except APIError as e:
+        err = e.args[0] if e.args and isinstance(e.args[0], dict) else {"message": str(e)}
+        msg = (err.get("message") or "").lower()
+        code = err.get("code")
+        if code == "23502" and "company_id" in msg:
+            # Try to infer a company_id from existing rows
+            try:
+                existing = (
+                    client.table("daily_logs")
+                    .select("company_id")
+                    .not_.is_("company_id", "null")
+                    .limit(1)
+                    .execute()
+                ).data or []
+            except Exception:
+                existing = []
+            if existing and existing[0].get("company_id") is not None:
+                company_id = existing[0]["company_id"]
+                if isinstance(payload, list):
+                    payload2 = [{**p, "company_id": company_id} for p in payload]
+                else:
+                    payload2 = {**payload, "company_id": company_id}
+                # Retry with inferred company_id
+                client.table("daily_logs").upsert(
+                    payload2, on_conflict="employee_role_id,date"
+                ).execute()
+                return True, None
+            else:
+                # No value to infer; instruct how to fix DB schema
+                fix = (
+                    "Your daily_logs table still requires company_id. "
+                    "Either drop NOT NULL:\n"
+                    "  ALTER TABLE daily_logs ALTER COLUMN company_id DROP NOT NULL;\n"
+                    "or drop the column:\n"
+                    "  ALTER TABLE daily_logs DROP COLUMN company_id;\n"
+                    "Then reload this page."
+                )
+                return False, {"shown": err, "howto": fix}
+        # Any other error
+        return False, {"shown": err, "howto": None}
+
+
+def upsert_daily_logs_in_chunks(client, payloads):
+    """
+    Bulk-upsert daily_logs rows in chunks of UPSERT_CHUNK_SIZE.
+    Returns (rows_written, errinfo); errinfo is None on success.
+    """
+    written = 0
+    for start in range(0, len(payloads), UPSERT_CHUNK_SIZE):
+        chunk = payloads[start:start + UPSERT_CHUNK_SIZE]
+        ok, errinfo = upsert_daily_log_with_company_fallback(client, chunk)
+        if not ok:
+            return written, errinfo
+        changes.bump("daily_logs", {row["date"] for row in chunk})
+        written += len(chunk)
+    return written, None
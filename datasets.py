@@ -0,0 +1,83 @@
+import pandas as pd
+
+PAGE_SIZE = 1000  # PostgREST's default max rows per response
+IN_FILTER_BATCH = 200  # values per in_() filter, to keep request URLs short
+
+# Column dtypes for the frames the financial views build. Labels repeat on every
+# row, so categories store each distinct string once. Per-row rates are only shown,
+# so float32 is plenty; amounts that get summed (pay, revenue, labor) stay float64
+# so multi-year totals keep their cents.
+LABEL = "category"
+RATE = "float32"
+
+MACHINE_LOG_COLUMNS = ["id", "date", "machine_id", "psa_number", "footage"]
+MACHINE_CREW_COLUMNS = ["machine_log_id", "employee_role_id"]
+PHOTO_DAY_COLUMNS = ["psa_number", "date", "photo_filenames", "last_uploaded"]
+
+
+def iter_pages(make_query, page_size=PAGE_SIZE):
+    """Yield `make_query()` results page by page with .range() until a short page comes back."""
+    offset = 0
+    while True:
+        page = make_query().range(offset, offset + page_size - 1).execute().data or []
+        yield page
+        if len(page) < page_size:
+            return
+        offset += len(page)
+
+
+def fetch_all(make_query, page_size=PAGE_SIZE):
+    """Every row of `make_query()` as a list of dicts."""
+    return [row for page in iter_pages(make_query, page_size) for row in page]
+
+
+def fetch_frame(make_query, columns, page_size=PAGE_SIZE):
+    """Every row of `make_query()` as a DataFrame, built a page at a time so row dicts never pile up."""
+    frames = [pd.DataFrame(page, columns=columns) for page in iter_pages(make_query, page_size)]
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+
+def typed(frame, dates=(), labels=(), rates=()):
+    """`frame` with real datetime64 dates, categorical labels and compact rate columns."""
+    return frame.assign(**{c: pd.to_datetime(frame[c]) for c in dates}).astype(
+        {**{c: LABEL for c in labels}, **{c: RATE for c in rates}}
+    )
+
+
+def load_machine_logs(client, start_date, end_date):
+    """machine_logs dated within [start_date, end_date], only the columns the financial views use."""
+    frame = fetch_frame(lambda: (
+        client.table("machine_logs")
+        .select(",".join(MACHINE_LOG_COLUMNS))
+        .gte("date", start_date.isoformat())
+        .lte("date", end_date.isoformat())
+        .order("id", desc=False)
+    ), MACHINE_LOG_COLUMNS)
+    frame["footage"] = pd.to_numeric(frame["footage"]).fillna(0)
+    return typed(frame, dates=["date"], labels=["psa_number"])
+
+
+def load_machine_crew(client, machine_log_ids):
+    """machine_employees rows for the given machine logs only."""
+    ids = list(machine_log_ids)
+    frames = [pd.DataFrame(columns=MACHINE_CREW_COLUMNS, dtype="int64")]
+    for start in range(0, len(ids), IN_FILTER_BATCH):
+        batch = ids[start:start + IN_FILTER_BATCH]
+        frames.append(fetch_frame(lambda: (
+            client.table("machine_employees")
+            .select(",".join(MACHINE_CREW_COLUMNS))
+            .in_("machine_log_id", batch)
+            .order("id", desc=False)
+        ), MACHINE_CREW_COLUMNS))
+    return pd.concat(frames, ignore_index=True).astype("int64")
+
+
+def load_photo_days(client):
+    """view_photos_by_psa (one row per PSA per day), newest first."""
+    frame = fetch_frame(lambda: (
+        client.table("view_photos_by_psa")
+        .select(",".join(PHOTO_DAY_COLUMNS))
+        .order("date", desc=True)
+        .order("psa_number", desc=False)
+    ), PHOTO_DAY_COLUMNS)
+    return typed(frame, dates=["date"], labels=["psa_number"])
@@ -0,0 +1,8 @@
+import streamlit as st
+import supabase
+
+
+@st.cache_resource(show_spinner=False)
+def get_supabase():
+    """One Supabase client per server process, shared by every page and session."""
+    return supabase.create_client(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"])
@@ -0,0 +1,308 @@
+"""
+In-memory stand-in for the Supabase client, used by loadtest.py.
+
+It implements only the query-builder calls the pages make. Every request is
+counted per simulated session and can be slowed by a fixed round-trip latency.
+"""
+import copy
+import datetime
+import hashlib
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from postgrest.exceptions import APIError
+from streamlit.runtime.scriptrunner_utils.script_run_context import get_script_run_ctx
+
+BACKGROUND = "background"  # requests made outside a script run, e.g. by the write-queue flusher
+
+
+def _comparable(value):
+    # ISO dates compare correctly as strings; numbers compare numerically
+    return value if isinstance(value, (int, float)) else str(value)
+
+
+class FakeQuery:
+    """One table request: builder methods record filters, execute() runs them."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.columns = "*"
+        self.filters = []
+        self.orders = []
+        self.offset = 0
+        self.row_limit = None
+        self.payload = None
+        self.on_conflict = "id"
+        self.ignore_duplicates = False
+        self.negate_next = False
+
+    def _filter(self, test):
+        if self.negate_next:
+            self.negate_next = False
+            self.filters.append(lambda row: not test(row))
+        else:
+            self.filters.append(test)
+        return self
+
+    @property
+    def not_(self):
+        self.negate_next = True
+        return self
+
+    def select(self, columns="*", **kwargs):
+        self.columns = columns
+        return self
+
+    def eq(self, column, value):
+        return self._filter(lambda row: row.get(column) == value)
+
+    def neq(self, column, value):
+        return self._filter(lambda row: row.get(column) != value)
+
+    def _compare(self, column, value, test):
+        return self._filter(
+            lambda row: row.get(column) is not None and test(_comparable(row[column]), _comparable(value))
+        )
+
+    def gt(self, column, value):
+        return self._compare(column, value, lambda a, b: a > b)
+
+    def gte(self, column, value):
+        return self._compare(column, value, lambda a, b: a >= b)
+
+    def lt(self, column, value):
+        return self._compare(column, value, lambda a, b: a < b)
+
+    def lte(self, column, value):
+        return self._compare(column, value, lambda a, b: a <= b)
+
+    def in_(self, column, values):
+        values = set(values)
+        return self._filter(lambda row: row.get(column) in values)
+
+    def is_(self, column, value):
+        return self._filter(lambda row: row.get(column) is None)
+
+    def ilike(self, column, pattern):
+        prefix = pattern.replace("%", "").replace("*", "").lower()
+        return self._filter(lambda row: str(row.get(column) or "").lower().startswith(prefix))
+
+    def or_(self, expression):
+        # only the "col.ilike.prefix*,col.ilike.prefix*" form contracts.search_contracts builds
+        terms = []
+        for part in expression.split(","):
+            column, _, pattern = part.split(".", 2)
+            terms.append((column, pattern.replace("*", "").replace("%", "").lower()))
+        return self._filter(
+            lambda row: any(str(row.get(c) or "").lower().startswith(p) for c, p in terms)
+        )
+
+    def order(self, column, desc=False, **kwargs):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def range(self, start, end):
+        self.offset = start
+        self.row_limit = end - start + 1
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict="id", ignore_duplicates=False, **kwargs):
+        self.op, self.payload = "upsert", payload
+        self.on_conflict = on_conflict or "id"
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def execute(self):
+        self.client.backend.request(self.client.session_key())
+        backend = self.client.backend
+        with backend.lock:
+            if self.table in backend.missing:
+                raise APIError({"message": f'relation "{self.table}" does not exist', "code": "42P01"})
+            rows = backend.tables.setdefault(self.table, [])
+            matched = [r for r in rows if all(test(r) for test in self.filters)]
+            data = getattr(self, f"_{self.op}")(backend, rows, matched)
+            return SimpleNamespace(data=copy.deepcopy(data), count=len(data))
+
+    def _select(self, backend, rows, matched):
+        for column, desc in reversed(self.orders):
+            matched.sort(key=lambda r: (r.get(column) is None, _comparable(r.get(column))), reverse=desc)
+        matched = matched[self.offset:]
+        if self.row_limit is not None:
+            matched = matched[:self.row_limit]
+        if self.columns != "*":
+            columns = [c.strip() for c in self.columns.split(",")]
+            matched = [{c: r.get(c) for c in columns} for r in matched]
+        return matched
+
+    def _insert(self, backend, rows, matched):
+        items = self.payload if isinstance(self.payload, list) else [self.payload]
+        saved = []
+        for item in items:
+            row = {"id": next(backend.ids), **item}
+            rows.append(row)
+            saved.append(row)
+        return saved
+
+    def _upsert(self, backend, rows, matched):
+        keys = [k.strip() for k in self.on_conflict.split(",")]
+        index = {tuple(r.get(k) for k in keys): r for r in rows}
+        items = self.payload if isinstance(self.payload, list) else [self.payload]
+        saved = []
+        for item in items:
+            existing = index.get(tuple(item.get(k) for k in keys))
+            if existing is None:
+                row = {"id": next(backend.ids), **item}
+                rows.append(row)
+                index[tuple(row.get(k) for k in keys)] = row
+                saved.append(row)
+            elif not self.ignore_duplicates:
+                existing.update(item)
+                saved.append(existing)
+        return saved
+
+    def _update(self, backend, rows, matched):
+        for row in matched:
+            row.update(self.payload)
+        return matched
+
+    def _delete(self, backend, rows, matched):
+        doomed = {id(r) for r in matched}
+        rows[:] = [r for r in rows if id(r) not in doomed]
+        return matched
+
+
+class FakeBucket:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def upload(self, path, file, file_options=None):
+        self.client.backend.request(self.client.session_key())
+        with self.client.backend.lock:
+            self.client.backend.files[(self.name, path)] = len(file)
+        return SimpleNamespace(path=path, full_path=f"{self.name}/{path}")
+
+
+class FakeClient:
+    """What create_client() returns: a view of the shared backend for one session."""
+
+    def __init__(self, backend, session):
+        self.backend = backend
+        self.session = session
+        self.storage = SimpleNamespace(from_=lambda name: FakeBucket(self, name))
+
+    def session_key(self):
+        # cached clients outlive the rerun that created them; only count script-run requests
+        if not get_script_run_ctx(suppress_warning=True):
+            return BACKGROUND
+        return self.backend.current_session() if self.backend.current_session else self.session
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, function, params=None):
+        self.backend.request(self.session_key())
+        raise APIError({"message": f"Could not find the function public.{function}", "code": "PGRST202"})
+
+
+class FakeBackend:
+    """Shared in-memory tables plus per-session request counters."""
+
+    def __init__(self, tables=None, latency=0.0, missing=(), current_session=None):
+        self.tables = tables or {}
+        self.latency = latency  # seconds of simulated round trip per request
+        self.missing = set(missing)  # tables that behave as if not created yet
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1_000_000)
+        self.files = {}
+        self.requests = Counter()
+        # the app shares one client across sessions, so ask who is rerunning per request
+        self.current_session = current_session
+
+    def client(self, session=BACKGROUND):
+        return FakeClient(self, session)
+
+    def request(self, session):
+        with self.lock:
+            self.requests[session] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def seed_tables(workers=40, days=90, logs_per_day=6, psas=25, photos_per_log=3, today=None, rng=None):
+    """Plausible data: a crew roster, `days` of daily and production logs, contracts and photos."""
+    rng = rng or random.Random(0)
+    today = today or datetime.date.today()
+    roles = []
+    for n in range(workers):
+        roles.append({"id": len(roles) + 1, "name": f"Worker {n:03d}", "role": "Laborer",
+                      "daily_rate": 180.0 + n % 5 * 10, "sort_order": n + 1})
+        if n % 4 == 0:
+            roles.append({"id": len(roles) + 1, "name": f"Worker {n:03d}", "role": "Operator",
+                          "daily_rate": 280.0, "sort_order": n + 1})
+    machines = [{"id": i, "name": f"Drill {i}"} for i in range(1, 6)]
+    psa_rates = [
+        {"id": i + 1, "psa_number": f"PSA{i:04d}", "company_name": f"Client {i % 6}",
+         "pay_rate": round(1.5 + i % 7 * 0.25, 2), "created_at": "2024-01-01T00:00:00+00:00"}
+        for i in range(psas)
+    ]
+
+    daily_logs, machine_logs, machine_employees, photos, photo_index = [], [], [], [], []
+    for back in range(days):
+        day = (today - datetime.timedelta(days=back)).isoformat()
+        for role in roles[:int(len(roles) * 0.8)]:
+            daily_logs.append({"id": len(daily_logs) + 1, "employee_role_id": role["id"], "date": day,
+                               "day_type": "full" if rng.random() < 0.85 else "half"})
+        for _ in range(logs_per_day):
+            log_id = len(machine_logs) + 1
+            psa = rng.choice(psa_rates)["psa_number"]
+            machine_logs.append({"id": log_id, "date": day, "machine_id": rng.choice(machines)["id"],
+                                 "psa_number": psa, "footage": rng.randint(50, 1500)})
+            for role in rng.sample(roles, 3):
+                machine_employees.append({"id": len(machine_employees) + 1, "machine_log_id": log_id,
+                                          "employee_role_id": role["id"]})
+            filenames = [f"{psa}/{day}/{log_id}_{k}.jpg" for k in range(photos_per_log)]
+            photos.append({"psa_number": psa, "date": day, "last_uploaded": f"{day}T17:00:00+00:00",
+                           "photo_filenames": filenames})
+            for filename in filenames:
+                photo_index.append({
+                    "id": len(photo_index) + 1, "filename": filename, "psa_number": psa, "log_date": day,
+                    "machine_log_id": log_id, "log_key": None,
+                    "captured_at": f"{day}T{rng.randint(7, 17):02d}:{rng.randint(0, 59):02d}:00",
+                    "width": 4032, "height": 3024, "bytes": rng.randint(1_500_000, 4_500_000),
+                    "sha256": hashlib.sha256(filename.encode()).hexdigest(),
+                    "uploaded_at": f"{day}T17:00:00+00:00",
+                })
+
+    return {
+        "employee_roles": roles,
+        "machines": machines,
+        "psa_rates": psa_rates,
+        "daily_logs": daily_logs,
+        "machine_logs": machine_logs,
+        "machine_employees": machine_employees,
+        "view_photos_by_psa": photos,
+        "photo_index": photo_index,
+    }
@@ -0,0 +1,118 @@
+import pandas as pd
+
+from datasets import MACHINE_LOG_COLUMNS, typed
+
+FIBER_PULLING = "Fiber Pulling"
+
+PAYROLL_COLUMNS = ["employee_role_id", "Name", "Role", "Date", "Day Type", "Daily Rate", "Daily Pay"]
+
+
+def per_foot(amount, footage):
+    """Element-wise amount / footage, 0 where there is no footage."""
+    return (amount / footage.where(footage > 0)).fillna(0.0)
+
+
+def payroll_frame(daily_logs, roster):
+    """
+    Per-worker, per-day pay from live daily_logs at the roster's current rates.
+    Logs whose employee_role row no longer exists are dropped.
+    """
+    logs = pd.DataFrame(daily_logs, columns=["employee_role_id", "date", "day_type"])
+    roles = pd.DataFrame(
+        [(r.id, r.name, r.role, r.daily_rate) for r in roster.records],
+        columns=["employee_role_id", "Name", "Role", "Daily Rate"],
+    )
+    # empty inputs come back as object columns, which merge refuses to join to int64
+    logs["employee_role_id"] = logs["employee_role_id"].astype("int64")
+    roles["employee_role_id"] = roles["employee_role_id"].astype("int64")
+    frame = logs.merge(roles, on="employee_role_id").rename(columns={"date": "Date", "day_type": "Day Type"})
+    # same rule as RoleRecord.day_pay: the full rate for "full", half otherwise
+    frame["Daily Pay"] = frame["Daily Rate"].where(frame["Day Type"] == "full", frame["Daily Rate"] / 2)
+    return typed_payroll(frame[PAYROLL_COLUMNS])
+
+
+def typed_payroll(frame):
+    return typed(frame, dates=["Date"], labels=["Name", "Role", "Day Type"], rates=["Daily Rate"])
+
+
+def labor_cost_by_log(machine_logs, machine_employees, payroll):
+    """
+    Labor cost per machine log id: the day pay (from a payroll_frame) of every
+    crew member on the log's date. Crew without pay for that date cost nothing.
+    """
+    if len(machine_logs) == 0 or len(machine_employees) == 0 or payroll.empty:
+        return pd.Series(dtype=float)
+
+    logs = pd.DataFrame(machine_logs, columns=MACHINE_LOG_COLUMNS)[["id", "date"]]
+    logs["date"] = pd.to_datetime(logs["date"])
+    crew = pd.DataFrame(machine_employees, columns=["machine_log_id", "employee_role_id"]).merge(
+        logs.rename(columns={"id": "machine_log_id", "date": "Date"}), on="machine_log_id"
+    )
+    pay = payroll[["employee_role_id", "Date", "Daily Pay"]].drop_duplicates(["employee_role_id", "Date"])
+    crew = crew.merge(pay, on=["employee_role_id", "Date"])
+    return crew.groupby("machine_log_id")["Daily Pay"].sum()
+
+
+def machine_log_frame(machine_logs, machine_lookup, labor_by_log):
+    """One row per machine log with machine name, footage and crew labor cost."""
+    logs = pd.DataFrame(machine_logs, columns=MACHINE_LOG_COLUMNS)
+    machine = logs["machine_id"].map(machine_lookup)
+    machine = machine.where(machine.notna(), logs["machine_id"].isna().map({True: FIBER_PULLING, False: "Unknown"}))
+    footage = pd.to_numeric(logs["footage"]).fillna(0)
+    labor = logs["id"].map(labor_by_log).fillna(0.0).astype(float)
+
+    frame = pd.DataFrame({
+        "id": logs["id"],
+        "Date": logs["date"],
+        "Machine": machine,
+        "PSA Number": logs["psa_number"],
+        "Footage": footage,
+        "Labor Cost": labor,
+        "Labor Cost per Foot": per_foot(labor, footage).round(2),
+    })
+    return typed(frame, dates=["Date"], labels=["Machine", "PSA Number"])
+
+
+def attach_pay_rates(frame, rate_history, psa_rates):
+    """
+    Add Company, Pay Rate, Revenue and Profit/Loss to a machine_log_frame.
+    Each log is priced with an as-of join: the latest psa_rate_history row for
+    its PSA effective on or before the log date. PSAs without history use the
+    current psa_rates.pay_rate; unknown PSAs get 0.
+    """
+    contracts = (
+        pd.DataFrame(psa_rates, columns=["psa_number", "company_name", "pay_rate"])
+        .drop_duplicates("psa_number", keep="last")
+        .set_index("psa_number")
+    )
+    # plain strings for the lookups; the result goes back to categories
+    psa = frame["PSA Number"].astype(object)
+
+    left = pd.DataFrame({
+        "row": range(len(frame)),
+        "psa_number": psa.fillna("").astype(str).to_numpy(),
+        "date": pd.to_datetime(frame["Date"]).to_numpy(),
+    }).sort_values("date", kind="stable")
+    right = (
+        rate_history.assign(psa_number=rate_history["psa_number"].astype(str))
+        .sort_values("effective_date", kind="stable")
+    )
+    priced = pd.merge_asof(
+        left, right, left_on="date", right_on="effective_date", by="psa_number", direction="backward"
+    ).sort_values("row")
+
+    current_rate = pd.to_numeric(psa.map(contracts["pay_rate"]), errors="coerce")
+    pay_rate = (
+        pd.Series(priced["pay_rate"].to_numpy(), index=frame.index, dtype=float)
+        .fillna(current_rate)
+        .fillna(0.0)
+    )
+    revenue = frame["Footage"] * pay_rate
+
+    priced = frame.assign(**{
+        "Company": psa.map(contracts["company_name"]).fillna("Unknown"),
+        "Pay Rate": pay_rate,
+        "Revenue": revenue,
+        "Profit/Loss": revenue - frame["Labor Cost"],
+    })
+    return typed(priced, labels=["Company"], rates=["Pay Rate"])
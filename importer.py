@@ -0,0 +1,310 @@
+import datetime
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from changes import changes
+from contracts import RATE_HISTORY_FLOOR, load_rate_history, rates_as_of
+from write_queue import MACHINE_LOG, flush_machine_logs, idempotency_key, save_daily_logs
+
+IMPORT_CHUNK_ROWS = 5000
+MAX_REJECTS_KEPT = 1000  # rejects beyond this are counted but not kept
+CREW_SEPARATOR = ";"
+LOOKUP_BATCH = 200  # values per in_() filter, to keep request URLs short
+LOG_WRITE_BATCH = 500  # production logs per machine_logs upsert
+
+DAILY_LOGS = "Daily logs"
+PRODUCTION_LOGS = "Production logs"
+CONTRACTS = "Contracts"
+
+# required columns per import kind (optional ones in the second list)
+IMPORT_COLUMNS = {
+    DAILY_LOGS: (["name", "role", "date", "day_type"], []),
+    PRODUCTION_LOGS: (["date", "machine", "psa_number", "footage", "crew"], []),
+    CONTRACTS: (["psa_number", "company_name", "pay_rate"], ["effective_date"]),
+}
+
+
+class ImportReport:
+    """Running totals for one import; keeps at most MAX_REJECTS_KEPT reject rows."""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_written = 0
+        self.reject_count = 0
+        self.rejects = []
+
+    def reject(self, row_numbers, reason):
+        for row_number in row_numbers:
+            self.reject_count += 1
+            if len(self.rejects) < MAX_REJECTS_KEPT:
+                self.rejects.append({"row": int(row_number), "reason": reason})
+
+    def rejects_frame(self):
+        return pd.DataFrame(self.rejects, columns=["row", "reason"])
+
+
+def iter_chunks(file, filename, chunk_rows=IMPORT_CHUNK_ROWS):
+    """
+    Stream a CSV or Parquet file as (DataFrame, fraction_done) chunks.
+    Every value is read as a string (or None) and column names are lower-cased.
+    """
+    if filename.lower().endswith(".parquet"):
+        parquet = pq.ParquetFile(file)
+        total = parquet.metadata.num_rows or 1
+        seen = 0
+        for batch in parquet.iter_batches(batch_size=chunk_rows):
+            chunk = batch.to_pandas()
+            chunk = chunk.astype(object).where(chunk.notna(), None)
+            chunk = chunk.apply(lambda col: col.map(lambda v: v if v is None else str(v)))
+            seen += len(chunk)
+            yield normalize_columns(chunk), seen / total
+    else:
+        size = getattr(file, "size", None)
+        reader = pd.read_csv(file, chunksize=chunk_rows, dtype=str, keep_default_na=False)
+        for chunk in reader:
+            chunk = chunk.replace("", None)
+            done = min(file.tell() / size, 1.0) if size else 0.0
+            yield normalize_columns(chunk), done
+
+
+def normalize_columns(chunk):
+    chunk.columns = [str(c).strip().lower() for c in chunk.columns]
+    return chunk
+
+
+def missing_columns(chunk, kind):
+    required, _ = IMPORT_COLUMNS[kind]
+    return [c for c in required if c not in chunk.columns]
+
+
+def stripped(series):
+    return series.map(lambda v: v.strip() if isinstance(v, str) else v)
+
+
+def parse_dates(series):
+    return pd.to_datetime(stripped(series), errors="coerce").dt.date
+
+
+def reject_where(report, chunk, mask, reason):
+    """Reject rows where `mask` holds and return the remaining rows."""
+    if mask.any():
+        report.reject(chunk.loc[mask, "source_row"], reason)
+    return chunk[~mask]
+
+
+# ---------------------------
+# Per-kind validation + writes
+# ---------------------------
+def import_daily_logs(client, chunk, roster, report):
+    chunk = chunk.assign(
+        name=stripped(chunk["name"]),
+        role=stripped(chunk["role"]),
+        date=parse_dates(chunk["date"]),
+        day_type=stripped(chunk["day_type"]).str.lower(),
+    )
+    role_ids = [
+        getattr(roster.by_name_role.get((n, r)), "id", None)
+        for n, r in zip(chunk["name"], chunk["role"])
+    ]
+    chunk = chunk.assign(employee_role_id=role_ids)
+
+    chunk = reject_where(report, chunk, chunk["employee_role_id"].isna(), "unknown name/role")
+    chunk = reject_where(report, chunk, chunk["date"].isna(), "invalid date")
+    chunk = reject_where(report, chunk, ~chunk["day_type"].isin(["full", "half"]), "day_type must be full or half")
+
+    # one row per (worker, date) per request; the last one in the file wins
+    chunk = chunk.drop_duplicates(["employee_role_id", "date"], keep="last")
+    payloads = [
+        {"employee_role_id": int(role_id), "date": day.isoformat(), "day_type": day_type}
+        for role_id, day, day_type in zip(chunk["employee_role_id"], chunk["date"], chunk["day_type"])
+    ]
+    # also re-prices the labor of production logs already counted for those days
+    try:
+        written, errinfo = save_daily_logs(client, payloads)
+    except Exception as e:
+        # e.g. the network dropped after retries; the upsert is safe to re-import
+        report.reject(chunk["source_row"], f"write failed: {e}")
+        return
+    if errinfo:
+        report.reject(chunk["source_row"].iloc[written:], f"write failed: {errinfo['shown'].get('message')}")
+    report.rows_written += written
+
+
+def import_production_logs(client, chunk, roster, machine_ids, report):
+    chunk = chunk.assign(
+        date=parse_dates(chunk["date"]),
+        machine=stripped(chunk["machine"]),
+        psa_number=stripped(chunk["psa_number"]),
+        footage=pd.to_numeric(stripped(chunk["footage"]), errors="coerce"),
+    )
+    chunk = reject_where(report, chunk, chunk["date"].isna(), "invalid date")
+    chunk = reject_where(report, chunk, ~chunk["machine"].isin(list(machine_ids)), "unknown machine")
+    # only this chunk's PSAs: psa_rates holds thousands of contracts
+    try:
+        known_psas = existing_pay_rates(client, chunk["psa_number"].dropna().unique().tolist())
+    except Exception as e:
+        report.reject(chunk["source_row"], f"PSA lookup failed: {e}")
+        return
+    chunk = reject_where(report, chunk, ~chunk["psa_number"].isin(list(known_psas)), "unknown PSA")
+    chunk = reject_where(report, chunk, chunk["footage"].isna() | (chunk["footage"] < 0), "invalid footage")
+
+    items = []
+    rows = []
+    for row in chunk.itertuples(index=False):
+        names = [n.strip() for n in (row.crew or "").split(CREW_SEPARATOR) if n.strip()]
+        crew = [roster.primary_role(n) for n in names]
+        if not all(crew):
+            unknown = [n for n, r in zip(names, crew) if not r]
+            report.reject([row.source_row], f"unknown crew: {', '.join(unknown)}")
+            continue
+
+        machine_id = machine_ids[row.machine]
+        log = {
+            "machine_id": None if machine_id == "fiber_pulling" else machine_id,
+            "date": row.date.isoformat(),
+            "footage": int(row.footage) if float(row.footage).is_integer() else float(row.footage),
+            "psa_number": row.psa_number,
+        }
+        if machine_id == "fiber_pulling":
+            log["operation_type"] = "Fiber Pulling"
+        payload = {"log": log, "crew": sorted(r.id for r in crew)}
+        # same key as the write queue, so re-importing a file never duplicates logs
+        items.append((None, idempotency_key(MACHINE_LOG, payload), MACHINE_LOG, payload))
+        rows.append(row.source_row)
+
+    for start in range(0, len(items), LOG_WRITE_BATCH):
+        try:
+            flush_machine_logs(client, items[start:start + LOG_WRITE_BATCH])
+        except Exception as e:
+            report.reject(rows[start:start + LOG_WRITE_BATCH], f"write failed: {e}")
+            continue
+        report.rows_written += len(items[start:start + LOG_WRITE_BATCH])
+
+
+def existing_pay_rates(client, psa_numbers):
+    """{psa_number: pay_rate} for those of `psa_numbers` already in psa_rates (LOOKUP_BATCH at a time)."""
+    found = {}
+    for start in range(0, len(psa_numbers), LOOKUP_BATCH):
+        rows = (
+            client.table("psa_rates")
+            .select("psa_number,pay_rate")
+            .in_("psa_number", psa_numbers[start:start + LOOKUP_BATCH])
+            .execute()
+        ).data or []
+        found.update((r["psa_number"], float(r["pay_rate"])) for r in rows)
+    return found
+
+
+def dated_rates(chunk, current, known, today):
+    """
+    psa_rate_history rows for a contracts chunk, the way the Revenue Tracker records a
+    rate change: rows without an effective_date change an existing contract's rate from
+    `today` (only if it differs from the rate in effect), and a contract's first change
+    seeds its old rate at RATE_HISTORY_FLOOR so footage logged before keeps it.
+    `current` maps existing contracts to their psa_rates.pay_rate, `known` is their history.
+    """
+    in_effect = {**current, **rates_as_of(known, today)}
+    if "effective_date" not in chunk.columns:
+        chunk = chunk.assign(effective_date=None)
+    undated = chunk["effective_date"].isna()
+    changed = chunk["psa_number"].isin(list(current)) & (chunk["pay_rate"] != chunk["psa_number"].map(in_effect))
+    dated = chunk[~undated | changed]
+    dated = dated.assign(effective_date=dated["effective_date"].where(dated["effective_date"].notna(), today))
+    dated = dated.drop_duplicates(["psa_number", "effective_date"], keep="last")
+
+    seeded = set(known["psa_number"])
+    first = dated.groupby("psa_number")["effective_date"].min()
+    history = [
+        {"psa_number": p, "pay_rate": current[p], "effective_date": RATE_HISTORY_FLOOR.isoformat()}
+        for p, day in first.items()
+        if p in current and p not in seeded and day > RATE_HISTORY_FLOOR
+    ]
+    history += [
+        {"psa_number": p, "pay_rate": float(rate), "effective_date": day.isoformat()}
+        for p, rate, day in zip(dated["psa_number"], dated["pay_rate"], dated["effective_date"])
+    ]
+    return history
+
+
+def import_contracts(client, chunk, report, rate_history_available, today):
+    chunk = chunk.assign(
+        psa_number=stripped(chunk["psa_number"]),
+        company_name=stripped(chunk["company_name"]),
+        pay_rate=pd.to_numeric(stripped(chunk["pay_rate"]), errors="coerce"),
+    )
+    chunk = reject_where(report, chunk, chunk["psa_number"].isna(), "missing psa_number")
+    chunk = reject_where(report, chunk, chunk["company_name"].isna(), "missing company_name")
+    chunk = reject_where(report, chunk, ~(chunk["pay_rate"] > 0), "pay_rate must be > 0")
+    if "effective_date" in chunk.columns:
+        given = chunk["effective_date"].notna()
+        chunk = chunk.assign(effective_date=parse_dates(chunk["effective_date"]))
+        chunk = reject_where(report, chunk, given & chunk["effective_date"].isna(), "invalid effective_date")
+    if chunk.empty:
+        return
+
+    latest = chunk.drop_duplicates("psa_number", keep="last")
+    current = existing_pay_rates(client, latest["psa_number"].tolist())
+    history = []
+    pay_rates = {}  # psa_rates.pay_rate to store, when it isn't simply the file's rate
+    if rate_history_available:
+        # the chunk's contracts only, paged, so a contract with history is never re-seeded
+        known, _ = load_rate_history(client, latest["psa_number"].tolist())
+        history = dated_rates(chunk, current, known, today)
+        # pay_rate holds the rate in effect today; a future-dated row leaves it alone
+        after = pd.concat([known, pd.DataFrame(history, columns=known.columns).astype({"pay_rate": float})])
+        after["effective_date"] = pd.to_datetime(after["effective_date"])
+        pay_rates = {**current, **rates_as_of(after, today)}
+
+    rows = [
+        {"psa_number": p, "company_name": c, "pay_rate": float(pay_rates.get(p, rate))}
+        for p, c, rate in zip(latest["psa_number"], latest["company_name"], latest["pay_rate"])
+    ]
+    updates = [r for r in rows if r["psa_number"] in current]
+    created_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    inserts = [{**r, "created_at": created_at} for r in rows if r["psa_number"] not in current]
+    try:
+        if history:
+            client.table("psa_rate_history").upsert(history, on_conflict="psa_number,effective_date").execute()
+        if updates:
+            client.table("psa_rates").upsert(updates, on_conflict="psa_number").execute()
+        if inserts:
+            client.table("psa_rates").insert(inserts).execute()
+    except Exception as e:
+        report.reject(chunk["source_row"], f"write failed: {e}")
+        return
+    finally:
+        # an upsert may have landed before a later request failed
+        changes.bump("psa_rates")
+        changes.bump("psa_rate_history")
+    report.rows_written += len(chunk)
+
+
+def import_file(client, kind, file, filename, roster, machines=(), rate_history_available=False,
+                on_progress=None, today=None):
+    """
+    Stream `file` in IMPORT_CHUNK_ROWS chunks, validating and bulk-writing each
+    chunk before reading the next. Row numbers in rejects are 1-based data rows.
+    `today` decides which contract rates are already in effect.
+    """
+    report = ImportReport()
+    today = today or datetime.date.today()
+    machine_ids = {m["name"]: m["id"] for m in machines}
+
+    for chunk, done in iter_chunks(file, filename):
+        missing = missing_columns(chunk, kind)
+        if missing:
+            raise ValueError(f"Missing column(s): {', '.join(missing)}")
+        chunk = chunk.assign(source_row=range(report.rows_read + 1, report.rows_read + len(chunk) + 1))
+        report.rows_read += len(chunk)
+
+        if kind == DAILY_LOGS:
+            import_daily_logs(client, chunk, roster, report)
+        elif kind == PRODUCTION_LOGS:
+            import_production_logs(client, chunk, roster, machine_ids, report)
+        else:
+            import_contracts(client, chunk, report, rate_history_available, today)
+
+        if on_progress:
+            on_progress(done, report)
+    return report
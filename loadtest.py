@@ -0,0 +1,289 @@
+"""
+Multi-session load test for the Streamlit pages, run against fake_backend.py.
+
+    python loadtest.py --sessions 20 --iterations 5 --latency-ms 30
+
+Each simulated session (one thread, one AppTest per page) saves today's logs on the
+Daily Tracker, slides the Financial Overview date range and filters and pages through
+the Photo Gallery. Reports rerun latency percentiles, backend requests per rerun and the
+traced memory each extra session keeps alive.
+"""
+import argparse
+import contextlib
+import datetime
+import gc
+import os
+import random
+import tempfile
+import threading
+import time
+import tracemalloc
+from unittest.mock import MagicMock, patch
+from urllib import parse
+
+import numpy as np
+import pandas as pd
+import pytz
+import streamlit as st
+from streamlit import logger as st_logger
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.pages_manager import PagesManager
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.runtime.secrets import Secrets
+from streamlit.testing.v1 import AppTest
+from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+from streamlit.testing.v1.util import patch_config_options
+
+from fake_backend import BACKGROUND, FakeBackend, seed_tables
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DAILY_TRACKER = os.path.join(ROOT, "Daily Tracker.py")
+FINANCIAL_OVERVIEW = os.path.join(ROOT, "pages", "Financial Overview.py")
+PHOTO_GALLERY = os.path.join(ROOT, "pages", "Photo Gallery.py")
+
+SECRETS = {
+    "SUPABASE_URL": "http://fake-supabase.local",
+    "SUPABASE_KEY": "loadtest",
+    "auth": {"admin_password": "loadtest"},
+}
+SESSION_KEY = "_loadtest_session"  # tells the fake backend which session is rerunning
+ADMIN_PASSWORD = SECRETS["auth"]["admin_password"]
+LOCAL_TZ = pytz.timezone("US/Central")
+
+
+class ConcurrentAppTest(AppTest):
+    """
+    AppTest whose reruns may overlap. AppTest.run installs a mock Runtime, the test
+    secrets and a config flag process-wide for each rerun and clears them afterwards,
+    so parallel reruns would tear each other down; here shared_app_runtime() installs
+    them once for the whole load test and _run only drives the script.
+    """
+
+    # one compiled-script cache for every session, as on a real server
+    script_cache = ScriptCache()
+
+    def _run(self, widget_state=None, timeout=None):
+        pages_manager = PagesManager(self._script_path, self.script_cache, setup_watcher=False)
+        runner = LocalScriptRunner(
+            self._script_path, self.session_state, pages_manager, args=self.args, kwargs=self.kwargs
+        )
+        # LocalScriptRunner brings its own cache; parallel first compiles trip a CPython 3.11 ast bug
+        runner._script_cache = self.script_cache
+        self._tree = runner.run(widget_state, self.query_params, timeout or self.default_timeout, self._page_hash)
+        self._tree._runner = self
+        self.query_params = parse.parse_qs(runner.event_data[-1]["client_state"].query_string)
+        return self
+
+
+@contextlib.contextmanager
+def shared_app_runtime(secrets):
+    """What AppTest._run sets up per rerun, set up once for every session."""
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    saved_secrets = st.secrets
+    st.secrets = Secrets()
+    st.secrets._secrets = secrets
+    Runtime._instance = runtime
+    try:
+        # streamlit re-applies logger.level from config, so quiet its widget warnings here
+        with patch_config_options({"global.appTest": True, "logger.level": "error"}):
+            st_logger.set_log_level("error")  # loggers created before the patch too
+            yield
+    finally:
+        Runtime._instance = None
+        st.secrets = saved_secrets
+
+
+class Session:
+    """One simulated user: its AppTests and the (page, action, seconds, requests) of every rerun."""
+
+    def __init__(self, name, backend, timeout):
+        self.name = name
+        self.backend = backend
+        self.timeout = timeout
+        self.samples = []
+        self.errors = []
+
+    def open(self, path):
+        at = ConcurrentAppTest(path, default_timeout=self.timeout)
+        at.session_state[SESSION_KEY] = self.name
+        return at
+
+    def rerun(self, at, page, action):
+        before = self.backend.requests[self.name]
+        started = time.perf_counter()
+        at.run()
+        elapsed = time.perf_counter() - started
+        self.samples.append((page, action, elapsed, self.backend.requests[self.name] - before))
+        for exception in at.exception:
+            self.errors.append(f"{page} / {action}: {exception.message}")
+        return at
+
+
+# ---------------------------
+# Scenarios
+# ---------------------------
+def daily_tracker(session, iterations, rng):
+    at = session.rerun(session.open(DAILY_TRACKER), "Daily Tracker", "load")
+    for _ in range(iterations):
+        for radio in at.radio:
+            if radio.key and radio.key.endswith("_daytype"):
+                radio.set_value(rng.choice(["full", "half", "none"]))
+        submit = next(b for b in at.button if b.label.startswith("✅ Save Today"))
+        submit.click()
+        at = session.rerun(at, "Daily Tracker", "submit today_logs_form")
+
+
+def financial_overview(session, iterations, rng, today):
+    at = session.rerun(session.open(FINANCIAL_OVERVIEW), "Financial Overview", "load")
+    at.text_input[0].set_value(ADMIN_PASSWORD)
+    at = session.rerun(at, "Financial Overview", "log in")
+    for _ in range(iterations):
+        at.date_input[0].set_value(today - datetime.timedelta(days=rng.randint(7, 60)))
+        at = session.rerun(at, "Financial Overview", "slide date range")
+
+
+def photo_gallery(session, iterations, rng):
+    at = session.rerun(session.open(PHOTO_GALLERY), "Photo Gallery", "load")
+    for _ in range(iterations):
+        if not at.selectbox:
+            return
+        at.text_input(key="photo_psa_prefix").set_value(f"PSA{rng.randint(0, 9)}")
+        at = session.rerun(at, "Photo Gallery", "pick PSA")
+        sort = at.selectbox[0]
+        sort.set_value(rng.choice(sort.options))
+        at = session.rerun(at, "Photo Gallery", "sort")
+        next_page = next((b for b in at.button if b.label == "Next ▶"), None)
+        if next_page is not None and not next_page.disabled:
+            next_page.click()
+            at = session.rerun(at, "Photo Gallery", "next page")
+
+
+def run_session(session, iterations, seed, today):
+    rng = random.Random(seed)
+    try:
+        daily_tracker(session, iterations, rng)
+        financial_overview(session, iterations, rng, today)
+        photo_gallery(session, iterations, rng)
+    except Exception as e:
+        session.errors.append(f"{type(e).__name__}: {e}")
+
+
+# ---------------------------
+# Measuring
+# ---------------------------
+def run_concurrent(backend, sessions, iterations, timeout, today):
+    """Run every session at once, one thread each; returns the Session objects."""
+    users = [Session(f"session-{n}", backend, timeout) for n in range(sessions)]
+    threads = [
+        threading.Thread(target=run_session, args=(user, iterations, n, today), name=user.name)
+        for n, user in enumerate(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return users
+
+
+def memory_per_session(backend, sessions, timeout, today):
+    """Traced bytes each additional session keeps alive, with every page open once."""
+    def open_all(user):
+        opened = [user.rerun(user.open(DAILY_TRACKER), "Daily Tracker", "load")]
+        at = user.rerun(user.open(FINANCIAL_OVERVIEW), "Financial Overview", "load")
+        at.text_input[0].set_value(ADMIN_PASSWORD)
+        opened.append(user.rerun(at, "Financial Overview", "log in"))
+        opened.append(user.rerun(user.open(PHOTO_GALLERY), "Photo Gallery", "load"))
+        return opened
+
+    # warm caches and imports first so they aren't charged to the measured sessions
+    open_all(Session("memory-warmup", backend, timeout))
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    kept = [open_all(Session(f"memory-{n}", backend, timeout)) for n in range(sessions)]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del kept
+    return used / sessions
+
+
+def summarize(users):
+    samples = pd.DataFrame(
+        [s for user in users for s in user.samples], columns=["page", "action", "seconds", "requests"]
+    )
+    summary = samples.groupby(["page", "action"], sort=False).agg(
+        reruns=("seconds", "size"),
+        p50_ms=("seconds", lambda s: np.percentile(s, 50) * 1000),
+        p95_ms=("seconds", lambda s: np.percentile(s, 95) * 1000),
+        p99_ms=("seconds", lambda s: np.percentile(s, 99) * 1000),
+        requests_per_rerun=("requests", "mean"),
+    )
+    overall = {
+        "reruns": len(samples),
+        "p50_ms": np.percentile(samples["seconds"], 50) * 1000,
+        "p95_ms": np.percentile(samples["seconds"], 95) * 1000,
+        "p99_ms": np.percentile(samples["seconds"], 99) * 1000,
+        "requests_per_rerun": samples["requests"].mean(),
+    }
+    summary.loc[("all", ""), :] = overall
+    return summary.round(1).astype({"reruns": int})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the Streamlit pages against an in-memory backend.")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument("--iterations", type=int, default=5, help="interactions per page per session")
+    parser.add_argument("--latency-ms", type=float, default=20, help="simulated round trip per backend request")
+    parser.add_argument("--workers", type=int, default=40, help="people on the seeded roster")
+    parser.add_argument("--days", type=int, default=90, help="days of seeded history")
+    parser.add_argument("--timeout", type=float, default=120, help="seconds before a single rerun counts as hung")
+    parser.add_argument("--skip-memory", action="store_true", help="skip the per-session memory measurement")
+    args = parser.parse_args(argv)
+
+    today = datetime.datetime.now(LOCAL_TZ).date()
+    backend = FakeBackend(
+        seed_tables(workers=args.workers, days=args.days, today=today),
+        latency=args.latency_ms / 1000,
+        # requests are made from inside page scripts, so session_state is the rerunning session's
+        current_session=lambda: st.session_state.get(SESSION_KEY, BACKGROUND),
+    )
+
+    def create_client(url, key, *rest, **kwargs):
+        return backend.client()
+
+    with (
+        tempfile.TemporaryDirectory() as scratch,
+        patch("supabase.create_client", create_client),
+        shared_app_runtime(SECRETS),
+    ):
+        # keep the write queue's SQLite file out of the working tree
+        os.environ["WRITE_QUEUE_PATH"] = os.path.join(scratch, "write_queue.sqlite3")
+
+        started = time.perf_counter()
+        users = run_concurrent(backend, args.sessions, args.iterations, args.timeout, today)
+        wall = time.perf_counter() - started
+
+        print(f"{args.sessions} sessions × {args.iterations} iterations, "
+              f"{args.latency_ms:g} ms simulated latency, {wall:.1f}s wall clock\n")
+        print(summarize(users).to_string())
+        print(f"\nbackground requests (write-queue flusher etc.): {backend.requests[BACKGROUND]}")
+
+        errors = [e for user in users for e in user.errors]
+        if errors:
+            print(f"\n{len(errors)} error(s); first few:")
+            for error in errors[:5]:
+                print(f"  {error}")
+
+        if not args.skip_memory:
+            per_session = memory_per_session(backend, args.sessions, args.timeout, today)
+            print(f"\ntraced memory per session: {per_session / 1024 / 1024:.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import datetime
+
+import pytz
+import streamlit as st
+
+from contracts import has_rate_history
+from db import get_supabase
+from importer import CREW_SEPARATOR, IMPORT_COLUMNS, MAX_REJECTS_KEPT, PRODUCTION_LOGS, import_file
+from roster import load_roster
+from session_store import session_machines
+
+# --- Local timezone (decides which imported contract rates are already in effect) ---
+LOCAL_TZ = pytz.timezone("US/Central")
+
+# --- Password Protection ---
+PASSWORD = st.secrets["auth"]["admin_password"]
+st.set_page_config(page_title="Data Import", layout="wide")
+st.title("📥 Bulk Data Import")
+
+entered = st.text_input("Enter admin password to continue", type="password")
+if entered != PASSWORD:
+    st.warning("Access restricted. Enter valid password.")
+    st.stop()
+
+# --- Supabase connection ---
+supabase = get_supabase()
+
+# --- What to import ---
+kind = st.radio("Import", list(IMPORT_COLUMNS), horizontal=True)
+required, optional = IMPORT_COLUMNS[kind]
+st.caption(
+    "Required columns: " + ", ".join(f"`{c}`" for c in required)
+    + (" · optional: " + ", ".join(f"`{c}`" for c in optional) if optional else "")
+)
+if kind == PRODUCTION_LOGS:
+    st.caption(f"`crew` lists worker names separated by `{CREW_SEPARATOR}`; each name's primary role is used.")
+
+uploaded = st.file_uploader("CSV or Parquet file", type=["csv", "parquet"])
+
+if uploaded and st.button("🚀 Start Import"):
+    roster = load_roster(supabase)
+    machines = []
+    rate_history_available = False
+    if kind == PRODUCTION_LOGS:
+        machines = session_machines(supabase)
+    else:
+        rate_history_available = has_rate_history(supabase)
+
+    progress = st.progress(0.0, text="Starting import...")
+
+    def show_progress(done, report):
+        progress.progress(
+            done,
+            text=f"Read {report.rows_read:,} rows · written {report.rows_written:,} · rejected {report.reject_count:,}",
+        )
+
+    try:
+        report = import_file(
+            supabase, kind, uploaded, uploaded.name, roster,
+            machines=machines,
+            rate_history_available=rate_history_available,
+            on_progress=show_progress,
+            today=datetime.datetime.now(LOCAL_TZ).date(),
+        )
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+
+    progress.progress(1.0, text="Done")
+    st.success(f"✅ Imported {report.rows_written:,} of {report.rows_read:,} rows.")
+
+    if report.reject_count:
+        st.warning(f"⚠️ {report.reject_count:,} rows rejected.")
+        rejects = report.rejects_frame()
+        if report.reject_count > MAX_REJECTS_KEPT:
+            st.caption(f"Showing the first {MAX_REJECTS_KEPT:,} rejects.")
+        st.dataframe(rejects, hide_index=True, use_container_width=True)
+        st.download_button(
+            "⬇️ Download rejects (CSV)",
+            rejects.to_csv(index=False),
+            file_name=f"rejects_{uploaded.name.rsplit('.', 1)[0]}.csv",
+            mime="text/csv",
+        )
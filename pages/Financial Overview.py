@@ -1,16 +1,35 @@
 import streamlit as st
-from supabase import create_client
 import datetime
 import pandas as pd
 import pytz
 import streamlit as st
 
+from contracts import RATE_HISTORY_HOWTO
+from datasets import load_machine_crew
+from db import get_supabase
+from financials import attach_pay_rates, labor_cost_by_log, machine_log_frame
+from payroll import SNAPSHOTS_HOWTO, close_period, closed_dates_in, load_payroll_frame
+from rollups import ROLLUPS_HOWTO, load_rollup_state, load_rollups, rollups_cover
+from roster import load_roster
+from session_store import (
+    session_closed_periods,
+    session_date_dataset,
+    session_machine_logs,
+    session_machines,
+    session_psa_rates,
+    session_rate_history,
+    sticky_date_input,
+)
+from write_queue import get_write_queue
 
 
 # --- Local timezone ---
 LOCAL_TZ = pytz.timezone("US/Central")
 local_today = datetime.datetime.now(LOCAL_TZ).date()
 
+# frames carry real datetime64 dates; show them without a time of day
+DATE_ONLY = {"Date": st.column_config.DateColumn("Date")}
+
 # --- Password Protection ---
 PASSWORD = st.secrets["auth"]["admin_password"]
 st.set_page_config(page_title="Financial Overview", layout="wide")
@@ -22,49 +41,77 @@ if entered != PASSWORD:
     st.stop()
 
 # --- Supabase connection ---
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_supabase()
 
 # --- Load datasets ---
-employee_roles = supabase.table("employee_roles").select("*").execute().data
-psa_rates = supabase.table("psa_rates").select("*").execute().data
-psa_rate_lookup = {p["psa_number"]: p for p in psa_rates}
-machines = supabase.table("machines").select("*").execute().data
-machine_lookup = {m["id"]: m["name"] for m in machines}
+roster = load_roster(supabase)
+rollup_state, rollups_available = load_rollup_state(supabase)
 
 # --- Date range selection ---
 with st.expander("📆 Date Range", expanded=True):
-    start_date = st.date_input("Start Date", local_today - datetime.timedelta(days=7))
-    end_date = st.date_input("End Date", local_today)
+    # the range is kept for the session, so coming back to this page doesn't reset it
+    start_date = sticky_date_input("Start Date", "working_start", local_today - datetime.timedelta(days=7))
+    end_date = sticky_date_input("End Date", "working_end", local_today)
+
+    covered = rollups_cover(rollup_state, start_date, end_date)
+    use_rollups = st.toggle("⚡ Use precomputed rollups", value=covered, disabled=not covered)
+    if not rollups_available:
+        st.caption(ROLLUPS_HOWTO)
+    elif use_rollups:
+        st.caption(
+            f"Daily rollups computed at {rollup_state['computed_at']} by `python rollups.py`; "
+            "changes saved since then show up after its next run. "
+            "Tables below show one row per day instead of per log."
+        )
+    elif rollup_state and rollup_state.get("covered_from"):
+        st.caption(
+            f"Rollups cover {rollup_state['covered_from']} → {rollup_state['covered_to']}, "
+            "the window the worker last recomputed."
+        )
 
-# --- Get logs ---
-daily_logs = supabase.table("daily_logs").select("*") \
-    .gte("date", str(start_date)).lte("date", str(end_date)).execute().data
-machine_logs = supabase.table("machine_logs").select("*") \
-    .gte("date", str(start_date)).lte("date", str(end_date)).execute().data
-machine_employees = supabase.table("machine_employees").select("*").execute().data
+periods, snapshots_available = session_closed_periods(supabase)
+closed_days = len(closed_dates_in(periods, start_date, end_date))
+
+if use_rollups:
+    # --- Read the worker's precomputed rows: no joins or pricing in this rerun ---
+    df_payroll, df_logs = load_rollups(supabase, start_date, end_date)
+    rate_history_available = rollup_state.get("priced_with_history", True)
+else:
+    # --- Lookups and logs are held for the session: sliding the range or coming back
+    # from another page only fetches days not held yet, or days written since ---
+    psa_rates = session_psa_rates(supabase)
+    rate_history, rate_history_available = session_rate_history(supabase)
+    machine_lookup = {m["id"]: m["name"] for m in session_machines(supabase)}
+
+    def fetch_crew(start, end):
+        logs = session_machine_logs(supabase, start, end)[["id", "date"]].rename(columns={"id": "machine_log_id"})
+        return load_machine_crew(supabase, logs["machine_log_id"].tolist()).merge(logs, on="machine_log_id")
+
+    # closed payroll periods come from their frozen snapshots
+    df_payroll = session_date_dataset(
+        "payroll", ("daily_logs", "payroll_periods", "payroll_snapshots"), start_date, end_date,
+        lambda s, e: load_payroll_frame(supabase, roster, periods, s, e), "Date", stamp=roster.epoch,
+    )
+    machine_logs = session_machine_logs(supabase, start_date, end_date)
+    machine_employees = session_date_dataset(
+        "machine_crew", ("machine_logs", "machine_employees"), start_date, end_date, fetch_crew, "date"
+    )
+
+    # --- Price every machine log once: crew labor + as-of contract rate ---
+    labor_by_log = labor_cost_by_log(machine_logs, machine_employees, df_payroll)
+    df_logs = attach_pay_rates(
+        machine_log_frame(machine_logs, machine_lookup, labor_by_log), rate_history, psa_rates
+    )
 
 # =========================
 # 1️⃣ Weekly Payroll
 # =========================
 with st.expander("🧾 Weekly Payroll Summary", expanded=True):
-    if daily_logs:
-        payroll_rows = []
-        for log in daily_logs:
-            role_data = next((r for r in employee_roles if r["id"] == log["employee_role_id"]), None)
-            if role_data:
-                pay = role_data["daily_rate"] if log["day_type"] == "full" else role_data["daily_rate"] / 2
-                payroll_rows.append({
-                    "Name": role_data["name"],
-                    "Role": role_data["role"],
-                    "Date": log["date"],
-                    "Day Type": log["day_type"],
-                    "Daily Pay": pay
-                })
-
-        df_payroll = pd.DataFrame(payroll_rows)
-        worker_summary = df_payroll.groupby("Name").agg(
+    if closed_days:
+        st.caption(f"🔒 {closed_days} day(s) in this range are closed and shown from payroll snapshots.")
+
+    if not df_payroll.empty:
+        worker_summary = df_payroll.groupby("Name", observed=True).agg(
             Total_Days=("Date", "count"),
             Total_Pay=("Daily Pay", "sum")
         ).reset_index()
@@ -73,44 +120,42 @@ with st.expander("🧾 Weekly Payroll Summary", expanded=True):
         total_payroll = df_payroll["Daily Pay"].sum()
         st.metric("💰 Total Weekly Payroll", f"${total_payroll:,.2f}")
     else:
+        total_payroll = 0
         st.info("No daily logs found for selected period.")
 
+    with st.popover("🔒 Close this period"):
+        if not snapshots_available:
+            st.caption(SNAPSHOTS_HOWTO)
+        else:
+            st.write(
+                f"Freeze payroll for **{start_date} → {end_date}** at current rates. "
+                "Closed days are read from the snapshot from then on and later rate "
+                "or log changes no longer affect them."
+            )
+            if end_date >= local_today:
+                st.caption("Only days before today can be closed; pick an end date before today.")
+            confirm_close = st.checkbox("I understand this can't be undone", key="confirm_close_period")
+            if st.button("Close period", disabled=not confirm_close or end_date >= local_today):
+                try:
+                    frozen = close_period(
+                        supabase, roster, start_date, end_date, local_today,
+                        get_write_queue(supabase).pending_dates(),
+                    )
+                except ValueError as e:
+                    st.error(str(e))
+                else:
+                    st.success(f"✅ Closed {start_date} → {end_date} ({frozen} payroll rows frozen).")
+                    st.rerun()
+
 # =========================
 # 2️⃣ Machine Production
 # =========================
 with st.expander("🛠️ Production Per Machine", expanded=True):
-    machine_financials = []
-    for log in machine_logs:
-        machine_name = machine_lookup.get(log["machine_id"], "Fiber Pulling" if log["machine_id"] is None else "Unknown")
-        footage = log.get("footage", 0)
-        labor_cost = 0
-
-        crew_links = [e for e in machine_employees if e["machine_log_id"] == log["id"]]
-        for crew in crew_links:
-            role_data = next((r for r in employee_roles if r["id"] == crew["employee_role_id"]), None)
-            if role_data:
-                daily_entry = next(
-                    (d for d in daily_logs if d["employee_role_id"] == crew["employee_role_id"] and d["date"] == log["date"]),
-                    None
-                )
-                if daily_entry:
-                    pay = role_data["daily_rate"] if daily_entry["day_type"] == "full" else role_data["daily_rate"] / 2
-                    labor_cost += pay
-
-        labor_per_foot = (labor_cost / footage) if footage > 0 else 0
-        machine_financials.append({
-            "Date": log["date"],
-            "Machine": machine_name,
-            "Footage": footage,
-            "Labor Cost": labor_cost,
-            "Labor Cost per Foot": round(labor_per_foot, 2)
-        })
-
-    df_machine = pd.DataFrame(machine_financials)
+    df_machine = df_logs[["Date", "Machine", "Footage", "Labor Cost", "Labor Cost per Foot"]]
     if not df_machine.empty:
-        st.dataframe(df_machine)
+        st.dataframe(df_machine, column_config=DATE_ONLY)
 
-        daily_machine_totals = df_machine.groupby(["Date", "Machine"]).agg({
+        daily_machine_totals = df_machine.groupby(["Date", "Machine"], observed=True).agg({
             "Footage": "sum",
             "Labor Cost": "sum"
         }).reset_index()
@@ -119,9 +164,9 @@ with st.expander("🛠️ Production Per Machine", expanded=True):
         )
 
         st.markdown("### 📅 Daily Totals per Machine")
-        st.dataframe(daily_machine_totals)
+        st.dataframe(daily_machine_totals, column_config=DATE_ONLY)
 
-        machine_summary = df_machine.groupby("Machine").agg({
+        machine_summary = df_machine.groupby("Machine", observed=True).agg({
             "Footage": "sum",
             "Labor Cost": "sum"
         }).reset_index()
@@ -138,42 +183,15 @@ with st.expander("🛠️ Production Per Machine", expanded=True):
 # 3️⃣ Revenue & Profit/Loss
 # =========================
 with st.expander("💰 Revenue & Profit/Loss", expanded=True):
-    revenue_rows = []
-    for log in machine_logs:
-        machine_name = machine_lookup.get(log["machine_id"], "Fiber Pulling" if log["machine_id"] is None else "Unknown")
-        psa = log.get("psa_number")
-        footage = log.get("footage", 0)
-
-        rate_info = psa_rate_lookup.get(psa, {})
-        pay_rate = float(rate_info.get("pay_rate") or 0)
-        company_name = rate_info.get("company_name", "Unknown")
-        revenue = footage * pay_rate
-
-        labor_cost = sum(
-            (role["daily_rate"] if dlog["day_type"] == "full" else role["daily_rate"] / 2)
-            for crew in [e for e in machine_employees if e["machine_log_id"] == log["id"]]
-            for role in [next((r for r in employee_roles if r["id"] == crew["employee_role_id"]), None)]
-            for dlog in [next((d for d in daily_logs if d["employee_role_id"] == crew["employee_role_id"] and d["date"] == log["date"]), None)]
-            if role and dlog
-        )
+    if not rate_history_available:
+        st.caption("Pricing all footage at current contract rates. " + RATE_HISTORY_HOWTO)
 
-        profit_loss = revenue - labor_cost
-
-        revenue_rows.append({
-            "Date": log["date"],
-            "Machine": machine_name,
-            "PSA Number": psa,
-            "Company": company_name,
-            "Footage": footage,
-            "Pay Rate": pay_rate,
-            "Revenue": revenue,
-            "Labor Cost": labor_cost,
-            "Profit/Loss": profit_loss
-        })
-
-    df_revenue = pd.DataFrame(revenue_rows)
+    df_revenue = df_logs[[
+        "Date", "Machine", "PSA Number", "Company", "Footage",
+        "Pay Rate", "Revenue", "Labor Cost", "Profit/Loss"
+    ]]
     if not df_revenue.empty:
-        st.dataframe(df_revenue)
+        st.dataframe(df_revenue, column_config=DATE_ONLY)
 
         total_revenue = df_revenue["Revenue"].sum()
         total_machine_labor = df_revenue["Labor Cost"].sum()
@@ -197,7 +215,7 @@ with st.expander("💰 Revenue & Profit/Loss", expanded=True):
 # =========================
 with st.expander("📘 Job Costing by PSA Number / Client", expanded=True):
     if not df_revenue.empty:
-        psa_costing = df_revenue.groupby(["PSA Number", "Company"]).agg({
+        psa_costing = df_revenue.groupby(["PSA Number", "Company"], observed=True).agg({
             "Footage": "sum",
             "Revenue": "sum",
             "Labor Cost": "sum",
@@ -1,33 +1,100 @@
 import streamlit as st
-from supabase import create_client
 import pandas as pd
 import datetime
 import pytz
 import streamlit as st
 
+from datasets import load_photo_days
+from db import get_supabase
+from photos import PHOTO_BUCKET, PHOTO_INDEX_HOWTO, PHOTO_SORTS, load_photo_page, photo_index_available
+from session_store import session_dataset
+
 
 # --- Local timezone ---
 LOCAL_TZ = pytz.timezone("US/Central")
+local_today = datetime.datetime.now(LOCAL_TZ).date()
 
 # --- Supabase setup ---
 SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_supabase()
 
 # --- Page config ---
 st.set_page_config(page_title="📷 Photo Gallery", layout="wide")
 st.title("📷 Machine Photo Gallery")
 
-# --- Load view_photos_by_psa ---
-photo_view = supabase.table("view_photos_by_psa").select("*").order("date", desc=True).execute().data
 
-if not photo_view:
-    st.info("No photos found.")
+def photo_url(filename):
+    return f"{SUPABASE_URL}/storage/v1/object/public/{PHOTO_BUCKET}/{filename}"
+
+
+# --- Photo index (written on upload); older uploads are only in view_photos_by_psa ---
+indexed = session_dataset("photo_index_available", ("photo_index",), lambda: photo_index_available(supabase))
+if indexed:
+    browse = st.radio(
+        "Browse",
+        ["📇 Indexed photos", "🗂 By PSA & day (includes older uploads)"],
+        horizontal=True,
+        label_visibility="collapsed",
+    )
+else:
+    browse = None
+    st.caption(PHOTO_INDEX_HOWTO)
+
+if browse == "📇 Indexed photos":
+    # --- Filters and sort run in the database; only one page of rows comes back ---
+    col1, col2, col3, col4 = st.columns(4)
+    psa_prefix = col1.text_input("🔍 PSA# (starts with; empty for all)", key="photo_psa_prefix").strip()
+    start_date = col2.date_input("📅 From", local_today - datetime.timedelta(days=30))
+    end_date = col3.date_input("📅 To", local_today)
+    sort = col4.selectbox("↕️ Sort by", list(PHOTO_SORTS))
+
+    # Page number; back to the first page whenever the filters change
+    filters = (psa_prefix, start_date, end_date, sort)
+    if st.session_state.get("photo_filters") != filters:
+        st.session_state.photo_filters = filters
+        st.session_state.photo_page = 0
+    page = st.session_state.photo_page
+
+    photos, has_more, _ = session_dataset(
+        "photo_page", ("photo_index",),
+        lambda: load_photo_page(supabase, psa_prefix, start_date, end_date, sort, page),
+        stamp=(filters, page),
+    )
+
+    if photos.empty:
+        st.info("No indexed photos match these filters.")
+    else:
+        cols = st.columns(3)
+        for i, photo in enumerate(photos.itertuples(index=False)):
+            details = [f"PSA# {photo.psa_number}", f"logged {photo.log_date:%Y-%m-%d}"]
+            if pd.notna(photo.captured_at):
+                details.append(f"taken {photo.captured_at:%Y-%m-%d %H:%M}")
+            if pd.notna(photo.width):
+                details.append(f"{int(photo.width)}×{int(photo.height)}")
+            details.append(f"{photo.bytes / 1024:,.0f} KB")
+            with cols[i % 3]:
+                st.image(photo_url(photo.filename), caption=" • ".join(details), use_column_width=True)
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("◀ Previous", disabled=page == 0):
+            st.session_state.photo_page -= 1
+            st.rerun()
+    with col_page:
+        st.caption(f"Page {page + 1}")
+    with col_next:
+        if st.button("Next ▶", disabled=not has_more):
+            st.session_state.photo_page += 1
+            st.rerun()
     st.stop()
 
-# --- Convert to DataFrame for filtering ---
-df_photos = pd.DataFrame(photo_view)
-df_photos["date"] = pd.to_datetime(df_photos["date"])
+# --- Load view_photos_by_psa (typed: categorical PSA, datetime64 date) ---
+# photos arrive with production logs, so a new log is what makes this stale
+df_photos = session_dataset("photo_days", ("machine_logs",), lambda: load_photo_days(supabase))
+
+if df_photos.empty:
+    st.info("No photos found.")
+    st.stop()
 
 # --- PSA and Date filters ---
 col1, col2 = st.columns(2)
@@ -52,8 +119,7 @@ photos = filtered.iloc[0]["photo_filenames"]
 cols = st.columns(3)
 for i, filename in enumerate(photos):
     with cols[i % 3]:
-        image_url = f"{SUPABASE_URL}/storage/v1/object/public/machinephotos/{filename}"
-        st.image(image_url, caption=filename.split("/")[-1], use_column_width=True)
+        st.image(photo_url(filename), caption=filename.split("/")[-1], use_column_width=True)
 
 st.markdown("---")
-st.info(f"Total photos: {len(photos)} • Last uploaded: {filtered.iloc[0]['last_uploaded']}")
\ No newline at end of file
+st.info(f"Total photos: {len(photos)} • Last uploaded: {filtered.iloc[0]['last_uploaded']}")
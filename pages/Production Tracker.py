@@ -1,12 +1,19 @@
 import streamlit as st
-from supabase import create_client
 import datetime
 import uuid
-import tempfile
-import os
+import pandas as pd
 import pytz
-from collections import defaultdict
 import streamlit as st
+from postgrest.exceptions import APIError
+
+from changes import changes
+from db import get_supabase
+from financials import FIBER_PULLING
+from photos import PHOTO_BUCKET, PHOTO_INDEX_HOWTO, find_photo, index_photo, photo_metadata
+from progress import record_log_edit
+from roster import load_roster
+from session_store import session_machine_logs, session_machines, sticky_date_input
+from write_queue import MACHINE_LOG, get_write_queue, next_submission, render_sync_status, submission_key
 
 
 # --- Timezone setup ---
@@ -14,32 +21,23 @@ LOCAL_TZ = pytz.timezone("US/Central")
 local_today = datetime.datetime.now(LOCAL_TZ).date()
 
 # --- Connect to Supabase ---
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_supabase()
 
 st.set_page_config(page_title="Machine Daily Production", layout="wide")
 st.title("🛠️ Machine Production Input")
 
 # --- Load machines & employees ---
-machines = supabase.table("machines").select("*").execute().data
-employee_roles = supabase.table("employee_roles").select("*").execute().data
-
-# --- Sort employees by sort_order ---
-grouped_roles = defaultdict(list)
-for r in employee_roles:
-    r["sort_order"] = int(r.get("sort_order") or 9999)
-    grouped_roles[r["name"]].append(r)
-
-sorted_names = sorted(grouped_roles.items(), key=lambda x: min(r["sort_order"] for r in x[1]))
-all_employees = [name for name, _ in sorted_names]
+machines = session_machines(supabase)
+roster = load_roster(supabase)  # names already ordered by sort_order
+write_queue = get_write_queue(supabase)
+render_sync_status(write_queue)
 
 # --- Add "Fiber Pulling" to the list of selectable machines ---
 machine_names = {m["name"]: m["id"] for m in machines}
 
 # --- Select date ---
 with st.expander("📆 Select Date"):
-    selected_date = st.date_input("Choose Date", local_today)
+    selected_date = sticky_date_input("Choose Date", "working_date", local_today)
 
 # --- Production entry form ---
 with st.expander("📝 Submit New Production Log", expanded=True):
@@ -49,7 +47,7 @@ with st.expander("📝 Submit New Production Log", expanded=True):
 
         psa_number = st.text_input("📘 PSA# (Blueprint Number)")
         footage = st.number_input("📏 Feet Bored / Pulled", min_value=0)
-        selected_names = st.multiselect("👷 Select Crew", options=all_employees)
+        selected_names = st.multiselect("👷 Select Crew", options=roster.names)
 
         uploaded_photos = st.file_uploader(
             "📸 Upload Photos (optional)", type=["jpg", "jpeg", "png"], accept_multiple_files=True
@@ -58,54 +56,124 @@ with st.expander("📝 Submit New Production Log", expanded=True):
         submitted = st.form_submit_button("✅ Submit This Production Log")
 
         if submitted:
-            # 1. Insert into machine_logs
+            # 1. The production log row
             if selected_machine_id == "fiber_pulling":
-                result = supabase.table("machine_logs").insert({
+                log_row = {
                     "machine_id": None,
                     "operation_type": "Fiber Pulling",
                     "date": str(selected_date),
                     "footage": footage,
                     "psa_number": psa_number
-                }).execute()
+                }
             else:
-                result = supabase.table("machine_logs").insert({
+                log_row = {
                     "machine_id": selected_machine_id,
                     "date": str(selected_date),
                     "footage": footage,
                     "psa_number": psa_number
-                }).execute()
-
-            machine_log_id = result.data[0]["id"]
-
-            # 2. Insert crew members
-            for name in selected_names:
-                role_entry = next((r for r in employee_roles if r["name"] == name), None)
-                if role_entry:
-                    supabase.table("machine_employees").insert({
-                        "machine_log_id": machine_log_id,
-                        "employee_role_id": role_entry["id"]
-                    }).execute()
-
-            # 3. Upload photos
-            if uploaded_photos:
-                for photo in uploaded_photos:
-                    unique_name = f"{selected_date}_{psa_number}_{uuid.uuid4()}.jpg"
-
-                    with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-                        tmp.write(photo.read())
-                        tmp_path = tmp.name
-
-                    res = supabase.storage.from_("machinephotos").upload(
+                }
+
+            # 2. Crew members (each name's primary role)
+            crew_ids = sorted(
+                role_entry.id
+                for role_entry in (roster.primary_role(name) for name in selected_names)
+                if role_entry
+            )
+
+            payload = {"log": log_row, "crew": crew_ids}
+            # per submission, not per content: two identical logs on one day are both real
+            log_key = submission_key(MACHINE_LOG, "machine_production_form")
+
+            # 3. Upload photos and index them (hash, size, EXIF time) before the log is
+            # queued, so the flusher can link them to the machine_logs row it creates
+            index_available = True
+            for photo in uploaded_photos or []:
+                data = photo.getvalue()
+                meta = photo_metadata(data)
+                unique_name = f"{selected_date}_{psa_number}_{uuid.uuid4()}.jpg"
+                try:
+                    existing, index_available = find_photo(supabase, meta["sha256"])
+                    if existing:
+                        st.info(
+                            f"⏭️ {photo.name} is already uploaded (PSA# {existing['psa_number']}, "
+                            f"{existing['log_date']}); skipped."
+                        )
+                        continue
+                    res = supabase.storage.from_(PHOTO_BUCKET).upload(
                         path=unique_name,
-                        file=tmp_path,
+                        file=data,
                         file_options={"content-type": photo.type}
                     )
-
-                    os.remove(tmp_path)
-
-                    if hasattr(res, "status_code") and res.status_code >= 400:
-                        st.error(f"❌ Failed to upload {photo.name}")
+                except Exception as e:
+                    # photos aren't queued; the log itself still goes to the write queue
+                    st.error(f"❌ Failed to upload {photo.name}: {e}")
+                    continue
+
+                if hasattr(res, "status_code") and res.status_code >= 400:
+                    st.error(f"❌ Failed to upload {photo.name}")
+                    continue
+                st.success(f"✅ Uploaded: {photo.name}")
+                if index_available:
+                    try:
+                        index_photo(supabase, {
+                            "filename": unique_name,
+                            "psa_number": psa_number,
+                            "log_date": selected_date.isoformat(),
+                            "log_key": log_key,
+                            **meta,
+                        })
+                    except Exception as e:
+                        st.warning(f"⚠️ {photo.name} was uploaded but not indexed: {e}")
+            if not index_available:
+                st.caption(PHOTO_INDEX_HOWTO)
+
+            # 4. Queue the log + crew locally; the background flusher writes them to Supabase
+            if write_queue.enqueue(MACHINE_LOG, payload, key=log_key):
+                st.success(f"✅ Production log saved for {selected_machine_name} with PSA#: {psa_number}")
+            else:
+                st.info("This production log is already waiting to sync; it won't be added twice.")
+            next_submission("machine_production_form")
+
+# --- Edit saved production logs (keeps the per-PSA progress counters in step) ---
+with st.expander("✏️ Edit Production Logs"):
+    day_logs = session_machine_logs(supabase, selected_date, selected_date)
+    if day_logs.empty:
+        st.info("No saved production logs for this date. Logs still waiting to sync show up once saved.")
+    machine_by_id = {m["id"]: m["name"] for m in machines}
+    for log in day_logs.astype({"psa_number": object}).to_dict("records"):
+        if pd.isna(log["machine_id"]):
+            machine = FIBER_PULLING
+        else:
+            machine = machine_by_id.get(log["machine_id"], "Unknown")
+        old_psa = log["psa_number"] if pd.notna(log["psa_number"]) else None
+        col1, col2, col3 = st.columns([2, 2, 1])
+        with col1:
+            new_psa = st.text_input(f"📘 PSA# ({machine})", old_psa or "", key=f"edit_psa_{log['id']}")
+        with col2:
+            new_footage = st.number_input(
+                "📏 Feet", min_value=0, value=int(log["footage"]), key=f"edit_footage_{log['id']}"
+            )
+        with col3:
+            if st.button("Update", key=f"btn_edit_log_{log['id']}"):
+                old_log = {"id": int(log["id"]), "date": selected_date.isoformat(), "machine_id": None,
+                           "psa_number": old_psa, "footage": float(log["footage"])}
+                new_log = {**old_log, "psa_number": new_psa.strip() or None, "footage": new_footage}
+                try:
+                    supabase.table("machine_logs").update(
+                        {"psa_number": new_log["psa_number"], "footage": new_footage}
+                    ).eq("id", old_log["id"]).execute()
+                except APIError as e:
+                    err = e.args[0] if e.args and isinstance(e.args[0], dict) else {"message": str(e)}
+                    st.error(f"Supabase error: {err.get('message')}")
+                else:
+                    changes.bump("machine_logs", [selected_date])
+                    try:
+                        record_log_edit(supabase, old_log, new_log)
+                    except Exception as e:
+                        st.warning(
+                            f"Log updated, but PSA progress wasn't ({e}); "
+                            "`python rollups.py --once --rebuild-progress` recounts it."
+                        )
                     else:
-                        st.success(f"✅ Uploaded: {photo.name}")
-
-            st.success(f"✅ Production log saved for {selected_machine_name} with PSA#: {psa_number}")
\ No newline at end of file
+                        st.success("Updated.")
+                        st.rerun()
@@ -1,17 +1,27 @@
 import streamlit as st
-from supabase import create_client
 import pandas as pd
 import datetime
 import pytz
 import streamlit as st
 
+from changes import changes
+from contracts import (
+    RATE_HISTORY_HOWTO,
+    get_contract,
+    load_rate_history,
+    rates_as_of,
+    record_rate_change,
+    search_contracts,
+)
+from db import get_supabase
+from progress import PROGRESS_HOWTO, load_progress
+
 # --- Local Timezone ---
 LOCAL_TZ = pytz.timezone("US/Central")
+local_today = datetime.datetime.now(LOCAL_TZ).date()
 
 # --- Supabase Connection ---
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_supabase()
 
 st.set_page_config(page_title="Revenue Tracker", layout="wide")
 st.markdown("""
@@ -56,6 +66,7 @@ with st.form("add_contract_form"):
             }).execute()
 
             if res.data:
+                changes.bump("psa_rates")
                 st.success(f"✅ Contract for PSA {psa_number} added.")
             else:
                 st.error("❌ Failed to add contract. PSA number might already exist.")
@@ -64,29 +75,91 @@ with st.form("add_contract_form"):
 
 st.markdown("---")
 
-# --- View All Contracts ---
+# --- Browse Contracts (server-side search + keyset pages) ---
 st.subheader("📋 Existing Contracts")
-contracts = supabase.table("psa_rates").select("*").order("created_at", desc=True).execute().data
+contract_search = st.text_input("🔍 Search by PSA or company (starts with)", key="contract_search")
+
+# Stack of page cursors (last psa_number of each previous page); reset on a new search
+if st.session_state.get("contract_search_term") != contract_search:
+    st.session_state.contract_search_term = contract_search
+    st.session_state.contract_cursors = [None]
+cursors = st.session_state.contract_cursors
+
+contracts, has_more = search_contracts(supabase, contract_search, after=cursors[-1])
 
 if contracts:
     df = pd.DataFrame(contracts)
-    st.dataframe(df)
+    # a future-dated rate only shows once it is in effect, whatever psa_rates.pay_rate says
+    page_history, _ = load_rate_history(supabase, df["psa_number"])
+    current_rates = rates_as_of(page_history, local_today)
+    df["pay_rate"] = df["psa_number"].map(current_rates).fillna(df["pay_rate"])
+    # running per-PSA totals, kept current as production logs are saved or edited
+    progress, progress_available = load_progress(supabase, df["psa_number"])
+    totals = pd.DataFrame(
+        [progress.get(p, {}) for p in df["psa_number"]],
+        columns=["footage", "revenue", "labor_cost", "log_count", "last_activity"],
+    ).rename(columns={
+        "footage": "Footage", "revenue": "Revenue", "labor_cost": "Labor Cost",
+        "log_count": "Logs", "last_activity": "Last Activity",
+    })
+    totals.insert(3, "Profit/Loss", totals["Revenue"] - totals["Labor Cost"])
+    if progress_available:
+        df = pd.concat([df, totals], axis=1)
+    st.dataframe(df, hide_index=True, use_container_width=True)
+    if not progress_available:
+        st.caption(PROGRESS_HOWTO)
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("◀ Previous", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Page {len(cursors)}")
+    with col_next:
+        if st.button("Next ▶", disabled=not has_more):
+            cursors.append(contracts[-1]["psa_number"])
+            st.rerun()
 
     st.subheader("✏️ Edit Contract")
     psa_list = [c["psa_number"] for c in contracts]
     selected_psa = st.selectbox("Select PSA to Edit", psa_list)
 
-    if selected_psa:
-        selected_contract = next(c for c in contracts if c["psa_number"] == selected_psa)
+    selected_contract = get_contract(supabase, selected_psa) if selected_psa else None
+    if selected_contract:
+        rate_history, rate_history_available = load_rate_history(supabase, [selected_psa])
         new_company = st.text_input("🏢 Company Name", value=selected_contract["company_name"])
-        new_rate = st.number_input("💵 Pay Rate (per foot)", min_value=0.0, step=0.01, value=float(selected_contract["pay_rate"]))
+        old_rate = float(rates_as_of(rate_history, local_today).get(selected_psa, selected_contract["pay_rate"]))
+        new_rate = st.number_input("💵 Pay Rate (per foot)", min_value=0.0, step=0.01, value=old_rate)
+        effective_date = st.date_input(
+            "📅 New rate effective from", local_today, key=f"rate_effective_{selected_psa}"
+        )
+
+        if not rate_history.empty:
+            st.caption("Rate history")
+            st.dataframe(
+                rate_history.assign(effective_date=rate_history["effective_date"].dt.date),
+                hide_index=True,
+            )
+        elif not rate_history_available:
+            st.caption(RATE_HISTORY_HOWTO)
 
         if st.button("💾 Save Changes"):
-            supabase.table("psa_rates").update({
-                "company_name": new_company,
-                "pay_rate": new_rate
-            }).eq("psa_number", selected_psa).execute()
+            updates = {"company_name": new_company}
+            if new_rate != old_rate and rate_history_available:
+                record_rate_change(supabase, selected_psa, old_rate, new_rate, effective_date)
+                # psa_rates.pay_rate holds the rate in effect today; saving also catches it
+                # up with a future-dated rate that has taken effect since
+                updates["pay_rate"] = new_rate if effective_date <= local_today else old_rate
+            elif rate_history_available:
+                updates["pay_rate"] = old_rate
+            elif new_rate != old_rate:
+                updates["pay_rate"] = new_rate
+            supabase.table("psa_rates").update(updates).eq("psa_number", selected_psa).execute()
+            changes.bump("psa_rates")
             st.success("✅ Contract updated.")
             st.rerun()
+elif contract_search:
+    st.info("No contracts match that search.")
 else:
     st.info("No contracts found.")
\ No newline at end of file
@@ -0,0 +1,207 @@
+import datetime
+
+import pandas as pd
+from postgrest.exceptions import APIError
+
+from changes import changes
+from contracts import is_missing_table
+from datasets import fetch_frame
+from financials import PAYROLL_COLUMNS, payroll_frame, typed_payroll
+from progress import MISSING_FUNCTION_CODE
+
+SNAPSHOT_INSERT_CHUNK = 500
+CLOSE_FUNCTION = "close_payroll_period"
+
+SNAPSHOTS_HOWTO = (
+    "Closing payroll periods needs two tables:\n"
+    "  CREATE TABLE payroll_periods (\n"
+    "    id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,\n"
+    "    start_date date NOT NULL,\n"
+    "    end_date date NOT NULL CHECK (end_date >= start_date),\n"
+    "    closed_at timestamptz NOT NULL DEFAULT now()\n"
+    "  );\n"
+    "  CREATE TABLE payroll_snapshots (\n"
+    "    id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,\n"
+    "    period_id bigint NOT NULL REFERENCES payroll_periods(id),\n"
+    "    employee_role_id bigint NOT NULL,\n"
+    "    name text NOT NULL,\n"
+    "    role text NOT NULL,\n"
+    "    date date NOT NULL,\n"
+    "    day_type text NOT NULL,\n"
+    "    daily_rate numeric NOT NULL,\n"
+    "    pay numeric NOT NULL,\n"
+    "    UNIQUE (employee_role_id, date)\n"
+    "  );\n"
+    "  CREATE INDEX ON payroll_snapshots (date);\n"
+    "and, so a failed close never leaves a half-written period, a function that writes one in a transaction:\n"
+    "  CREATE FUNCTION close_payroll_period(period_start date, period_end date, snapshots jsonb)\n"
+    "  RETURNS void LANGUAGE sql AS $$\n"
+    "    WITH period AS (\n"
+    "      INSERT INTO payroll_periods (start_date, end_date) VALUES (period_start, period_end) RETURNING id\n"
+    "    )\n"
+    "    INSERT INTO payroll_snapshots (period_id, employee_role_id, name, role, date, day_type, daily_rate, pay)\n"
+    "      SELECT period.id, s.employee_role_id, s.name, s.role, s.date, s.day_type, s.daily_rate, s.pay\n"
+    "      FROM period, jsonb_populate_recordset(NULL::payroll_snapshots, snapshots) AS s;\n"
+    "  $$;\n"
+    "Snapshots are never updated; once the function exists, revoke UPDATE/DELETE on both tables to\n"
+    "enforce it. Without the function a failed close is rolled back with DELETE, so keep DELETE until then."
+)
+
+
+def load_closed_periods(client):
+    """Return (periods, available): closed (start_date, end_date) pairs, oldest first."""
+    try:
+        rows = (
+            client.table("payroll_periods")
+            .select("start_date,end_date")
+            .order("start_date", desc=False)
+            .execute()
+        ).data or []
+    except APIError as e:
+        if is_missing_table(e):
+            return [], False
+        raise
+    periods = [
+        (datetime.date.fromisoformat(r["start_date"]), datetime.date.fromisoformat(r["end_date"]))
+        for r in rows
+    ]
+    return periods, True
+
+
+def closed_dates_in(periods, start_date, end_date):
+    """Dates in [start_date, end_date] covered by a closed period."""
+    covered = set()
+    for p_start, p_end in periods:
+        day = max(p_start, start_date)
+        while day <= min(p_end, end_date):
+            covered.add(day)
+            day += datetime.timedelta(days=1)
+    return covered
+
+
+def load_snapshot_frame(client, start_date, end_date):
+    """Frozen payroll rows for [start_date, end_date], shaped like financials.payroll_frame."""
+    columns = ["employee_role_id", "name", "role", "date", "day_type", "daily_rate", "pay"]
+    frame = fetch_frame(lambda: (
+        client.table("payroll_snapshots")
+        .select(",".join(columns))
+        .gte("date", start_date.isoformat())
+        .lte("date", end_date.isoformat())
+        .order("id", desc=False)
+    ), columns)
+    frame = frame.rename(columns={
+        "name": "Name", "role": "Role", "date": "Date", "day_type": "Day Type",
+        "daily_rate": "Daily Rate", "pay": "Daily Pay",
+    })
+    frame["Daily Pay"] = frame["Daily Pay"].astype(float)
+    return typed_payroll(frame[PAYROLL_COLUMNS])
+
+
+def load_live_payroll(client, roster, start_date, end_date, skip_dates=()):
+    """Recompute payroll from daily_logs for [start_date, end_date], leaving out `skip_dates`."""
+    columns = ["employee_role_id", "date", "day_type"]
+    daily_logs = fetch_frame(lambda: (
+        client.table("daily_logs")
+        .select(",".join(columns))
+        .gte("date", start_date.isoformat())
+        .lte("date", end_date.isoformat())
+        .order("id", desc=False)
+    ), columns)
+    skip = {d.isoformat() for d in skip_dates}
+    return payroll_frame(daily_logs[~daily_logs["date"].isin(skip)], roster)
+
+
+def load_payroll(client, roster, start_date, end_date):
+    """
+    Payroll for [start_date, end_date]: closed dates come straight from
+    payroll_snapshots and only the open dates are recomputed from daily_logs.
+    Returns (frame, closed_days, snapshots_available).
+    """
+    periods, available = load_closed_periods(client)
+    frame = load_payroll_frame(client, roster, periods, start_date, end_date)
+    return frame, len(closed_dates_in(periods, start_date, end_date)), available
+
+
+def load_payroll_frame(client, roster, periods, start_date, end_date):
+    """load_payroll's frame, for closed `periods` the caller already has."""
+    covered = closed_dates_in(periods, start_date, end_date)
+    open_days = [
+        start_date + datetime.timedelta(days=i)
+        for i in range((end_date - start_date).days + 1)
+        if start_date + datetime.timedelta(days=i) not in covered
+    ]
+
+    frames = []
+    if covered:
+        frames.append(load_snapshot_frame(client, min(covered), max(covered)))
+    if open_days:
+        frames.append(load_live_payroll(client, roster, open_days[0], open_days[-1], skip_dates=covered))
+    frames = [f for f in frames if not f.empty]
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=PAYROLL_COLUMNS)
+    # concatenating categoricals with different categories falls back to object
+    return typed_payroll(frame)
+
+
+def insert_period(client, start_date, end_date, rows):
+    """close_period without the close_payroll_period function: insert, and delete again on failure."""
+    period = client.table("payroll_periods").insert({
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+    }).execute().data[0]
+    rows = [{**r, "period_id": period["id"]} for r in rows]
+    try:
+        for start in range(0, len(rows), SNAPSHOT_INSERT_CHUNK):
+            client.table("payroll_snapshots").insert(rows[start:start + SNAPSHOT_INSERT_CHUNK]).execute()
+    except Exception:
+        client.table("payroll_snapshots").delete().eq("period_id", period["id"]).execute()
+        client.table("payroll_periods").delete().eq("id", period["id"]).execute()
+        raise
+
+
+def close_period(client, roster, start_date, end_date, today, pending_dates=()):
+    """
+    Freeze payroll for [start_date, end_date]: write the period and one immutable snapshot
+    row per worker per day at today's rates, in one transaction through close_payroll_period.
+    Returns the number of rows written.
+    Raises ValueError if the range reaches today, has daily_logs still waiting in the
+    write queue (`pending_dates`, ISO dates) or overlaps an already closed period:
+    logs saved for a closed day later are never counted.
+    """
+    if end_date >= today:
+        raise ValueError("Only days before today can be closed; today's logs may still be coming in.")
+    pending = sorted(d for d in pending_dates if start_date.isoformat() <= d <= end_date.isoformat())
+    if pending:
+        raise ValueError(
+            f"Daily logs for {', '.join(pending)} are still waiting to sync; close the period once they're saved."
+        )
+    periods, _ = load_closed_periods(client)
+    if closed_dates_in(periods, start_date, end_date):
+        raise ValueError("That range overlaps a period that is already closed.")
+
+    frame = load_live_payroll(client, roster, start_date, end_date)
+    rows = [
+        {
+            "employee_role_id": int(r["employee_role_id"]),
+            "name": r["Name"],
+            "role": r["Role"],
+            "date": r["Date"].date().isoformat(),
+            "day_type": r["Day Type"],
+            # Daily Rate is float32 in the frame; store the cents, not 187.3300018310547
+            "daily_rate": round(float(r["Daily Rate"]), 2),
+            "pay": float(r["Daily Pay"]),
+        }
+        for r in frame.to_dict("records")
+    ]
+    try:
+        client.rpc(CLOSE_FUNCTION, {
+            "period_start": start_date.isoformat(),
+            "period_end": end_date.isoformat(),
+            "snapshots": rows,
+        }).execute()
+    except APIError as e:
+        if getattr(e, "code", None) != MISSING_FUNCTION_CODE:
+            raise
+        insert_period(client, start_date, end_date, rows)
+    changes.bump("payroll_periods")
+    changes.bump("payroll_snapshots", {r["date"] for r in rows})
+    return len(rows)
@@ -0,0 +1,171 @@
+import datetime
+import hashlib
+import io
+
+import pandas as pd
+from PIL import Image, UnidentifiedImageError
+from postgrest.exceptions import APIError
+
+from changes import changes
+from contracts import SEARCH_STRIP_CHARS, is_missing_table
+from datasets import IN_FILTER_BATCH, typed
+
+PHOTO_BUCKET = "machinephotos"
+PHOTO_PAGE_SIZE = 24
+PHOTO_INDEX_COLUMNS = [
+    "filename", "psa_number", "log_date", "machine_log_id",
+    "captured_at", "width", "height", "bytes", "sha256", "uploaded_at",
+]
+# sort label -> (column, descending)
+PHOTO_SORTS = {
+    "Newest taken": ("captured_at", True),
+    "Oldest taken": ("captured_at", False),
+    "Newest upload": ("uploaded_at", True),
+    "Largest file": ("bytes", True),
+}
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867  # when the shutter fired, in the Exif IFD
+EXIF_DATETIME = 306  # last modified, in IFD0; older cameras only set this
+EXIF_TIME_FORMAT = "%Y:%m:%d %H:%M:%S"
+UNIQUE_VIOLATION = "23505"
+
+PHOTO_INDEX_HOWTO = (
+    "Filtering photos by capture time, size or machine log needs the photo_index table:\n"
+    "  CREATE TABLE photo_index (\n"
+    "    id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,\n"
+    "    filename text NOT NULL UNIQUE,\n"
+    "    psa_number text,\n"
+    "    log_date date NOT NULL,\n"
+    "    machine_log_id bigint REFERENCES machine_logs(id),\n"
+    "    log_key text,\n"
+    "    captured_at timestamp,\n"
+    "    width integer,\n"
+    "    height integer,\n"
+    "    bytes bigint NOT NULL,\n"
+    "    sha256 text NOT NULL UNIQUE,\n"
+    "    uploaded_at timestamptz NOT NULL DEFAULT now()\n"
+    "  );\n"
+    "  CREATE INDEX ON photo_index (psa_number, log_date);\n"
+    "  CREATE INDEX ON photo_index (log_date, captured_at);\n"
+    "  CREATE INDEX ON photo_index (log_key) WHERE machine_log_id IS NULL;\n"
+    "Photos uploaded before it existed stay browsable by PSA and day."
+)
+
+
+def photo_metadata(data):
+    """Content hash, byte size, pixel size and EXIF capture time of an uploaded photo."""
+    meta = {
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "bytes": len(data),
+        "width": None,
+        "height": None,
+        "captured_at": None,
+    }
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            meta["width"], meta["height"] = image.size
+            exif = image.getexif()
+            taken = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    except (UnidentifiedImageError, OSError):
+        return meta
+    if taken:
+        try:
+            # camera clock, no timezone: stored as-is
+            meta["captured_at"] = datetime.datetime.strptime(str(taken).strip("\x00 "), EXIF_TIME_FORMAT).isoformat()
+        except ValueError:
+            pass
+    return meta
+
+
+def photo_index_available(client):
+    try:
+        client.table("photo_index").select("id").limit(1).execute()
+    except APIError as e:
+        if is_missing_table(e):
+            return False
+        raise
+    return True
+
+
+def find_photo(client, sha256):
+    """Return (row, available): the indexed photo with this content hash, if any."""
+    try:
+        rows = (
+            client.table("photo_index")
+            .select("filename,psa_number,log_date")
+            .eq("sha256", sha256)
+            .limit(1)
+            .execute()
+        ).data or []
+    except APIError as e:
+        if is_missing_table(e):
+            return None, False
+        raise
+    return (rows[0] if rows else None), True
+
+
+def index_photo(client, row):
+    """Insert one photo_index row; returns False if the same content was indexed meanwhile."""
+    try:
+        client.table("photo_index").insert(row).execute()
+    except APIError as e:
+        if getattr(e, "code", None) == UNIQUE_VIOLATION:
+            return False
+        raise
+    changes.bump("photo_index", [row["log_date"]])
+    return True
+
+
+def link_photos(client, ids):
+    """
+    Fill in machine_log_id on photos uploaded while their production log was still
+    queued; `ids` maps write-queue keys to the machine_logs ids they were saved as.
+    """
+    keys = list(ids)
+    try:
+        for start in range(0, len(keys), IN_FILTER_BATCH):
+            rows = (
+                client.table("photo_index")
+                .select("log_key")
+                .in_("log_key", keys[start:start + IN_FILTER_BATCH])
+                .is_("machine_log_id", "null")
+                .execute()
+            ).data or []
+            for key in {r["log_key"] for r in rows}:
+                client.table("photo_index").update({"machine_log_id": ids[key]}).eq("log_key", key).execute()
+    except APIError as e:
+        if not is_missing_table(e):
+            raise
+
+
+def load_photo_page(client, psa_prefix, start_date, end_date, sort, page, page_size=PHOTO_PAGE_SIZE):
+    """
+    Return (frame, has_more, available): page `page` (from 0) of indexed photos logged
+    within [start_date, end_date], optionally only PSAs starting with `psa_prefix`
+    (case-insensitive), in PHOTO_SORTS[sort] order.
+    """
+    column, desc = PHOTO_SORTS[sort]
+    query = (
+        client.table("photo_index")
+        .select(",".join(PHOTO_INDEX_COLUMNS))
+        .gte("log_date", start_date.isoformat())
+        .lte("log_date", end_date.isoformat())
+    )
+    term = "".join(c for c in (psa_prefix or "").strip() if c not in SEARCH_STRIP_CHARS)
+    if term:
+        query = query.ilike("psa_number", f"{term}*")
+    try:
+        # one extra row says whether there is a next page
+        rows = (
+            query.order(column, desc=desc, nullsfirst=False)
+            .order("id", desc=True)
+            .range(page * page_size, (page + 1) * page_size)
+            .execute()
+        ).data or []
+    except APIError as e:
+        if is_missing_table(e):
+            return pd.DataFrame(columns=PHOTO_INDEX_COLUMNS), False, False
+        raise
+    frame = pd.DataFrame(rows[:page_size], columns=PHOTO_INDEX_COLUMNS)
+    frame = typed(frame, dates=["log_date", "captured_at"], labels=["psa_number"])
+    return frame, len(rows) > page_size, True
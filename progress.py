@@ -0,0 +1,284 @@
+import pandas as pd
+from postgrest.exceptions import APIError
+
+from changes import changes
+from contracts import is_missing_table, load_rate_history
+from datasets import IN_FILTER_BATCH, MACHINE_CREW_COLUMNS, MACHINE_LOG_COLUMNS, fetch_all, load_machine_crew
+from financials import attach_pay_rates, labor_cost_by_log, machine_log_frame, payroll_frame
+from roster import RoleRecord, Roster, normalize_role_rows
+
+PROGRESS_FUNCTION = "add_psa_progress"
+MISSING_FUNCTION_CODE = "PGRST202"
+PROGRESS_COLUMNS = ["psa_number", "footage", "revenue", "labor_cost", "log_count", "last_activity"]
+PROGRESS_WRITE_CHUNK = 500
+
+PROGRESS_HOWTO = (
+    "Per-contract progress needs the psa_progress table and its increment function:\n"
+    "  CREATE TABLE psa_progress (\n"
+    "    psa_number text PRIMARY KEY,\n"
+    "    footage numeric NOT NULL DEFAULT 0,\n"
+    "    revenue numeric NOT NULL DEFAULT 0,\n"
+    "    labor_cost numeric NOT NULL DEFAULT 0,\n"
+    "    log_count integer NOT NULL DEFAULT 0,\n"
+    "    last_activity date\n"
+    "  );\n"
+    "  CREATE FUNCTION add_psa_progress(deltas jsonb) RETURNS void LANGUAGE sql AS $$\n"
+    "    INSERT INTO psa_progress AS p (psa_number, footage, revenue, labor_cost, log_count, last_activity)\n"
+    "    SELECT * FROM jsonb_to_recordset(deltas) AS d(psa_number text, footage numeric,\n"
+    "      revenue numeric, labor_cost numeric, log_count integer, last_activity date)\n"
+    "    ON CONFLICT (psa_number) DO UPDATE SET\n"
+    "      footage = p.footage + excluded.footage,\n"
+    "      revenue = p.revenue + excluded.revenue,\n"
+    "      labor_cost = p.labor_cost + excluded.labor_cost,\n"
+    "      log_count = p.log_count + excluded.log_count,\n"
+    "      last_activity = greatest(p.last_activity, excluded.last_activity);\n"
+    "  $$;\n"
+    "Fill it from existing logs with `python rollups.py --once --rebuild-progress`."
+)
+
+
+# ---------------------------
+# Pricing
+# ---------------------------
+def price_logs(client, logs, crew):
+    """
+    Job-cost just these machine_logs rows the way the Financial Overview does: crew
+    day pay on the log date plus footage at the as-of contract rate. `crew` holds
+    their machine_employees rows.
+    """
+    logs = pd.DataFrame(logs, columns=MACHINE_LOG_COLUMNS)
+    crew = pd.DataFrame(crew, columns=MACHINE_CREW_COLUMNS)
+    role_ids = crew["employee_role_id"].drop_duplicates().tolist()
+    dates = logs["date"].drop_duplicates().tolist()
+    psas = logs["psa_number"].dropna().drop_duplicates().tolist()
+
+    daily_logs, psa_rates = [], []
+    for start in range(0, len(role_ids), IN_FILTER_BATCH):
+        batch = role_ids[start:start + IN_FILTER_BATCH]
+        daily_logs += fetch_all(lambda: (
+            client.table("daily_logs")
+            .select("employee_role_id,date,day_type")
+            .in_("date", dates)
+            .in_("employee_role_id", batch)
+            .order("id")
+        ))
+    for start in range(0, len(psas), IN_FILTER_BATCH):
+        batch = psas[start:start + IN_FILTER_BATCH]
+        psa_rates += client.table("psa_rates").select("psa_number,company_name,pay_rate").in_(
+            "psa_number", batch
+        ).execute().data or []
+    rate_history, _ = load_rate_history(client, psas)
+
+    payroll = payroll_frame(daily_logs, load_roles(client, role_ids))
+    # labor is keyed by log id; record_log_edit prices two versions of the same log
+    labor_by_log = labor_cost_by_log(logs.drop_duplicates("id"), crew, payroll)
+    return attach_pay_rates(machine_log_frame(logs, {}, labor_by_log), rate_history, psa_rates)
+
+
+def load_roles(client, role_ids):
+    """A Roster of just these employee_roles rows, for pricing crew days."""
+    role_ids = list(role_ids)
+    roles = []
+    for start in range(0, len(role_ids), IN_FILTER_BATCH):
+        batch = role_ids[start:start + IN_FILTER_BATCH]
+        roles += fetch_all(lambda: (
+            client.table("employee_roles").select("id,name,role,daily_rate,sort_order").in_("id", batch).order("id")
+        ))
+    return Roster([RoleRecord.from_row(r) for r in normalize_role_rows(roles)])
+
+
+def progress_rows(priced, sign=1):
+    """
+    psa_progress rows (or, with sign=-1, their reversal) from priced logs: one per PSA.
+    Logs without a PSA belong to no contract and are left out.
+    """
+    psa = priced["PSA Number"].astype(object)
+    priced = priced[psa.notna() & (psa != "")].assign(psa_number=psa)
+    totals = priced.groupby("psa_number").agg(
+        footage=("Footage", "sum"),
+        revenue=("Revenue", "sum"),
+        labor_cost=("Labor Cost", "sum"),
+        log_count=("id", "size"),
+        last_activity=("Date", "max"),
+    )
+    return [
+        {
+            "psa_number": psa_number,
+            "footage": sign * float(r.footage),
+            "revenue": round(sign * float(r.revenue), 2),
+            "labor_cost": round(sign * float(r.labor_cost), 2),
+            "log_count": sign * int(r.log_count),
+            # taking a log back out never moves the last activity date
+            "last_activity": r.last_activity.date().isoformat() if sign > 0 else None,
+        }
+        for psa_number, r in totals.iterrows()
+    ]
+
+
+def combine(rows):
+    """Sum progress rows per PSA; one statement can't update the same row twice."""
+    merged = {}
+    for row in rows:
+        total = merged.setdefault(row["psa_number"], {**row, "footage": 0.0, "revenue": 0.0,
+                                                       "labor_cost": 0.0, "log_count": 0})
+        for column in ("footage", "revenue", "labor_cost", "log_count"):
+            total[column] += row[column]
+        total["last_activity"] = max(filter(None, (total["last_activity"], row["last_activity"])), default=None)
+    return list(merged.values())
+
+
+# ---------------------------
+# Counters
+# ---------------------------
+def add_progress(client, deltas):
+    """
+    Add per-PSA deltas to psa_progress; returns False if the table doesn't exist.
+    Goes through the add_psa_progress function so concurrent writers can't lose an
+    update; without it, falls back to read-modify-write.
+    """
+    if not deltas:
+        return True
+    try:
+        try:
+            client.rpc(PROGRESS_FUNCTION, {"deltas": deltas}).execute()
+        except APIError as e:
+            if getattr(e, "code", None) != MISSING_FUNCTION_CODE:
+                raise
+            _add_progress_without_function(client, deltas)
+    except APIError as e:
+        if is_missing_table(e):
+            return False
+        raise
+    changes.bump("psa_progress")
+    return True
+
+
+def _add_progress_without_function(client, deltas):
+    current = {
+        r["psa_number"]: r
+        for r in client.table("psa_progress").select(",".join(PROGRESS_COLUMNS)).in_(
+            "psa_number", [d["psa_number"] for d in deltas]
+        ).execute().data or []
+    }
+    rows = []
+    for delta in deltas:
+        row = current.get(delta["psa_number"])
+        rows.append(combine([delta, row])[0] if row else delta)
+    client.table("psa_progress").upsert(rows, on_conflict="psa_number").execute()
+
+
+def record_new_logs(client, logs, crew):
+    """Count newly saved machine_logs rows (with their crew) toward their contracts."""
+    return add_progress(client, progress_rows(price_logs(client, logs, crew)))
+
+
+def record_log_edit(client, old_log, new_log):
+    """Move a machine_logs row's contribution from its old values to its new ones."""
+    crew = load_machine_crew(client, [old_log["id"]])
+    priced = price_logs(client, [old_log, new_log], crew)
+    deltas = progress_rows(priced.iloc[[0]], sign=-1) + progress_rows(priced.iloc[[1]])
+    return add_progress(client, combine(deltas))
+
+
+def load_crew_days(client, rows):
+    """The saved daily_logs rows for the worker-days (employee_role_id, date) in `rows`."""
+    days = {(r["employee_role_id"], r["date"]) for r in rows}
+    role_ids = sorted({role_id for role_id, _ in days})
+    dates = sorted({day for _, day in days})
+    found = []
+    for r_start in range(0, len(role_ids), IN_FILTER_BATCH):
+        role_batch = role_ids[r_start:r_start + IN_FILTER_BATCH]
+        for d_start in range(0, len(dates), IN_FILTER_BATCH):
+            date_batch = dates[d_start:d_start + IN_FILTER_BATCH]
+            found += fetch_all(lambda: (
+                client.table("daily_logs")
+                .select("employee_role_id,date,day_type")
+                .in_("employee_role_id", role_batch)
+                .in_("date", date_batch)
+                .order("id")
+            ))
+    return [r for r in found if (r["employee_role_id"], r["date"]) in days]
+
+
+def record_crew_days(client, before, after):
+    """
+    Move the labor of production logs already counted by the change in crew day pay:
+    `before` and `after` are the daily_logs rows of the same worker-days as they were
+    and as they are now (a worker-day missing from one side wasn't logged there).
+    A log counted before its crew's days were entered was priced without them.
+    """
+    role_ids = {r["employee_role_id"] for r in [*before, *after]}
+    roster = load_roles(client, role_ids)
+
+    def day_pay(rows):
+        payroll = payroll_frame(rows, roster).drop_duplicates(["employee_role_id", "Date"], keep="last")
+        return payroll.set_index(["employee_role_id", "Date"])["Daily Pay"].astype(float)
+
+    change = day_pay(after).sub(day_pay(before), fill_value=0.0)
+    change = change[change.round(2) != 0].rename("change").reset_index()
+    if change.empty:
+        return True
+
+    dates = sorted(change["Date"].dt.date.map(lambda d: d.isoformat()).unique())
+    logs = []
+    for start in range(0, len(dates), IN_FILTER_BATCH):
+        batch = dates[start:start + IN_FILTER_BATCH]
+        logs += fetch_all(lambda: (
+            client.table("machine_logs").select("id,date,psa_number").in_("date", batch).order("id")
+        ))
+    logs = pd.DataFrame(logs, columns=["id", "date", "psa_number"])
+    logs = logs[logs["psa_number"].notna() & (logs["psa_number"] != "")]
+    if logs.empty:
+        return True
+
+    crew = load_machine_crew(client, logs["id"].tolist()).merge(
+        logs.assign(Date=pd.to_datetime(logs["date"])).rename(columns={"id": "machine_log_id"}),
+        on="machine_log_id",
+    ).merge(change, on=["employee_role_id", "Date"])
+    labor = crew.groupby("psa_number")["change"].sum()
+    return add_progress(client, [
+        {"psa_number": psa_number, "footage": 0.0, "revenue": 0.0, "labor_cost": round(float(amount), 2),
+         "log_count": 0, "last_activity": None}
+        for psa_number, amount in labor.items()
+        if round(float(amount), 2)
+    ])
+
+
+def progress_available(client):
+    try:
+        client.table("psa_progress").select("psa_number").limit(1).execute()
+    except APIError as e:
+        if is_missing_table(e):
+            return False
+        raise
+    return True
+
+
+def load_progress(client, psa_numbers):
+    """Return ({psa_number: progress row}, available) for the given contracts."""
+    psa_numbers = list(psa_numbers)
+    progress = {}
+    try:
+        for start in range(0, len(psa_numbers), IN_FILTER_BATCH):
+            rows = client.table("psa_progress").select(",".join(PROGRESS_COLUMNS)).in_(
+                "psa_number", psa_numbers[start:start + IN_FILTER_BATCH]
+            ).execute().data or []
+            progress.update((r["psa_number"], r) for r in rows)
+    except APIError as e:
+        if is_missing_table(e):
+            return {}, False
+        raise
+    return progress, True
+
+
+def replace_progress(client, rows):
+    """Overwrite psa_progress with `rows` (a full rebuild) and drop PSAs that no longer have logs."""
+    for start in range(0, len(rows), PROGRESS_WRITE_CHUNK):
+        client.table("psa_progress").upsert(rows[start:start + PROGRESS_WRITE_CHUNK], on_conflict="psa_number").execute()
+    keep = {r["psa_number"] for r in rows}
+    stale = [r["psa_number"] for r in fetch_all(
+        lambda: client.table("psa_progress").select("psa_number").order("psa_number")
+    ) if r["psa_number"] not in keep]
+    for start in range(0, len(stale), IN_FILTER_BATCH):
+        client.table("psa_progress").delete().in_("psa_number", stale[start:start + IN_FILTER_BATCH]).execute()
+    changes.bump("psa_progress")
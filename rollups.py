@@ -0,0 +1,372 @@
+"""
+Precomputed Financial Overview rollups.
+
+Run outside Streamlit, e.g. from cron or a systemd timer:
+
+    python rollups.py --once              # recompute the trailing window once
+    python rollups.py --interval 300      # keep running, checking every 5 minutes
+    python rollups.py --once --full       # rebuild every day that has logs (covered until the next run)
+    python rollups.py --once --rebuild-progress   # also recount per-PSA progress from all logs
+
+Credentials come from SUPABASE_URL / SUPABASE_KEY or .streamlit/secrets.toml.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+import pytz
+from postgrest.exceptions import APIError
+
+from contracts import is_missing_table, load_rate_history
+from datasets import fetch_all, fetch_frame, load_machine_crew, load_machine_logs, typed
+from financials import attach_pay_rates, labor_cost_by_log, machine_log_frame, per_foot, typed_payroll
+from payroll import load_payroll
+from progress import MISSING_FUNCTION_CODE, PROGRESS_HOWTO, progress_available, progress_rows, replace_progress
+from roster import RoleRecord, Roster, fetch_employee_roles
+
+DEFAULT_WINDOW_DAYS = 35  # trailing days recomputed per run; pages only trust rollups inside it
+DEFAULT_MAX_AGE_SECONDS = 3600  # recompute at least this often even if inputs look unchanged
+ROLLUP_WRITE_CHUNK = 500
+LOCAL_TZ = pytz.timezone("US/Central")  # same "today" as the pages
+SECRETS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml")
+
+PAYROLL_ROLLUP = "rollup_payroll_daily"
+PRODUCTION_ROLLUP = "rollup_production_daily"
+ROLLUP_TABLES = (PAYROLL_ROLLUP, PRODUCTION_ROLLUP)
+REPLACE_FUNCTION = "replace_rollups"
+
+ROLLUPS_HOWTO = (
+    "Precomputed rollups need these tables (filled by `python rollups.py`):\n"
+    "  CREATE TABLE rollup_payroll_daily (\n"
+    "    date date NOT NULL, employee_role_id bigint NOT NULL,\n"
+    "    name text NOT NULL, role text NOT NULL, day_type text NOT NULL,\n"
+    "    daily_rate numeric NOT NULL, pay numeric NOT NULL,\n"
+    "    PRIMARY KEY (date, employee_role_id)\n"
+    "  );\n"
+    "  CREATE TABLE rollup_production_daily (\n"
+    "    date date NOT NULL, machine text NOT NULL, psa_number text NOT NULL,\n"
+    "    company text NOT NULL, footage numeric NOT NULL, labor_cost numeric NOT NULL,\n"
+    "    revenue numeric NOT NULL, log_count integer NOT NULL,\n"
+    "    PRIMARY KEY (date, machine, psa_number)\n"
+    "  );\n"
+    "  CREATE TABLE rollup_state (\n"
+    "    id integer PRIMARY KEY, covered_from date, covered_to date,\n"
+    "    fingerprint text, priced_with_history boolean, computed_at timestamptz\n"
+    "  );\n"
+    "and, so pages never read a half-replaced window, a function that swaps one in a transaction:\n"
+    "  CREATE FUNCTION replace_rollups(start_date date, end_date date, payroll jsonb,\n"
+    "                                  production jsonb, state jsonb) RETURNS void LANGUAGE sql AS $$\n"
+    "    DELETE FROM rollup_payroll_daily WHERE date BETWEEN start_date AND end_date;\n"
+    "    DELETE FROM rollup_production_daily WHERE date BETWEEN start_date AND end_date;\n"
+    "    INSERT INTO rollup_payroll_daily\n"
+    "      SELECT * FROM jsonb_populate_recordset(NULL::rollup_payroll_daily, payroll);\n"
+    "    INSERT INTO rollup_production_daily\n"
+    "      SELECT * FROM jsonb_populate_recordset(NULL::rollup_production_daily, production);\n"
+    "    INSERT INTO rollup_state SELECT * FROM jsonb_populate_record(NULL::rollup_state, state)\n"
+    "    ON CONFLICT (id) DO UPDATE SET covered_from = excluded.covered_from,\n"
+    "      covered_to = excluded.covered_to, fingerprint = excluded.fingerprint,\n"
+    "      priced_with_history = excluded.priced_with_history, computed_at = excluded.computed_at;\n"
+    "  $$;"
+)
+
+
+# ---------------------------
+# Computing
+# ---------------------------
+def load_inputs(client, start_date, end_date):
+    """Everything the Financial Overview reads for [start_date, end_date]."""
+    roster = Roster([RoleRecord.from_row(r) for r in fetch_employee_roles(client)])
+    payroll, _, _ = load_payroll(client, roster, start_date, end_date)
+    machine_logs = load_machine_logs(client, start_date, end_date)
+    return {
+        "payroll": payroll,
+        "machine_logs": machine_logs,
+        "machine_crew": load_machine_crew(client, machine_logs["id"].tolist()),
+        "machines": client.table("machines").select("id,name").execute().data or [],
+        "psa_rates": fetch_all(
+            lambda: client.table("psa_rates").select("psa_number,company_name,pay_rate").order("psa_number")
+        ),
+        "rate_history": load_rate_history(client),
+    }
+
+
+def fingerprint(inputs):
+    """Content hash of the inputs; unchanged inputs mean unchanged rollups."""
+    digest = hashlib.sha256()
+    rate_history, available = inputs["rate_history"]
+    for name in ("payroll", "machine_logs", "machine_crew"):
+        digest.update(inputs[name].to_json(orient="values", date_format="iso").encode())
+    digest.update(rate_history.to_json(orient="values", date_format="iso").encode())
+    for name in ("machines", "psa_rates"):
+        digest.update(json.dumps(inputs[name], sort_keys=True, default=str).encode())
+    digest.update(str(available).encode())
+    return digest.hexdigest()
+
+
+def priced_logs(inputs):
+    """Every machine log in load_inputs() with its crew labor and as-of revenue."""
+    rate_history, _ = inputs["rate_history"]
+    machine_lookup = {m["id"]: m["name"] for m in inputs["machines"]}
+    labor_by_log = labor_cost_by_log(inputs["machine_logs"], inputs["machine_crew"], inputs["payroll"])
+    return attach_pay_rates(
+        machine_log_frame(inputs["machine_logs"], machine_lookup, labor_by_log), rate_history, inputs["psa_rates"]
+    )
+
+
+def compute_rollups(inputs):
+    """{table: rows} for every rollup table, from load_inputs()."""
+    payroll = inputs["payroll"]
+    logs = priced_logs(inputs)
+
+    payroll_rows = [
+        {
+            "date": r["Date"].date().isoformat(),
+            "employee_role_id": int(r["employee_role_id"]),
+            "name": r["Name"],
+            "role": r["Role"],
+            "day_type": r["Day Type"],
+            "daily_rate": round(float(r["Daily Rate"]), 2),
+            "pay": float(r["Daily Pay"]),
+        }
+        for r in payroll.drop_duplicates(["employee_role_id", "Date"], keep="last").to_dict("records")
+    ]
+
+    # logs without a PSA are kept under "" so their labor still counts toward the totals
+    production = (
+        logs.assign(**{"PSA Number": logs["PSA Number"].astype(object).fillna("")})
+        .groupby(["Date", "Machine", "PSA Number", "Company"], as_index=False, observed=True)
+        .agg(footage=("Footage", "sum"), labor_cost=("Labor Cost", "sum"),
+             revenue=("Revenue", "sum"), log_count=("id", "count"))
+    )
+    production_rows = [
+        {
+            "date": r["Date"].date().isoformat(),
+            "machine": r["Machine"],
+            "psa_number": r["PSA Number"],
+            "company": r["Company"],
+            "footage": float(r["footage"]),
+            "labor_cost": round(float(r["labor_cost"]), 2),
+            "revenue": round(float(r["revenue"]), 2),
+            "log_count": int(r["log_count"]),
+        }
+        for r in production.to_dict("records")
+    ]
+
+    return {PAYROLL_ROLLUP: payroll_rows, PRODUCTION_ROLLUP: production_rows}
+
+
+# ---------------------------
+# Storing + reading
+# ---------------------------
+def load_rollup_state(client):
+    """Return (state row or None, available)."""
+    try:
+        rows = client.table("rollup_state").select("*").eq("id", 1).execute().data or []
+    except APIError as e:
+        if is_missing_table(e):
+            return None, False
+        raise
+    return (rows[0] if rows else None), True
+
+
+def store_rollups(client, start_date, end_date, rollups, digest, priced_with_history):
+    """
+    Replace every rollup row in [start_date, end_date] and mark exactly that window as
+    covered. Days before it were computed by earlier runs and may have changed since
+    (backfills, retroactive rates, log edits), so they stop being covered.
+    Returns False if it had to swap without the replace_rollups function.
+    """
+    state = {
+        "id": 1,
+        "covered_from": start_date.isoformat(),
+        "covered_to": end_date.isoformat(),
+        "fingerprint": digest,
+        "priced_with_history": priced_with_history,
+        "computed_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+    try:
+        client.rpc(REPLACE_FUNCTION, {
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "payroll": rollups[PAYROLL_ROLLUP],
+            "production": rollups[PRODUCTION_ROLLUP],
+            "state": state,
+        }).execute()
+        return True
+    except APIError as e:
+        if getattr(e, "code", None) != MISSING_FUNCTION_CODE:
+            raise
+
+    # Without the function: nothing is covered while the window is half-replaced, so
+    # pages compute from live data instead of reading it
+    client.table("rollup_state").upsert(
+        {**state, "covered_from": None, "covered_to": None, "fingerprint": None}, on_conflict="id"
+    ).execute()
+    for table in ROLLUP_TABLES:
+        client.table(table).delete().gte("date", start_date.isoformat()).lte("date", end_date.isoformat()).execute()
+        rows = rollups[table]
+        for start in range(0, len(rows), ROLLUP_WRITE_CHUNK):
+            client.table(table).insert(rows[start:start + ROLLUP_WRITE_CHUNK]).execute()
+    client.table("rollup_state").upsert(state, on_conflict="id").execute()
+    return False
+
+
+def rollups_cover(state, start_date, end_date):
+    """True if the worker has computed every day in [start_date, end_date]."""
+    return bool(
+        state and state.get("covered_from")
+        and state["covered_from"] <= start_date.isoformat()
+        and end_date.isoformat() <= state["covered_to"]
+    )
+
+
+def load_rollups(client, start_date, end_date):
+    """
+    Rollups for [start_date, end_date] shaped like the Financial Overview's live frames:
+    (payroll, production). Payroll rows are one per worker per day; production rows
+    one per day, machine and PSA.
+    """
+    def rows(table, columns, *key):
+        # order by the full primary key so .range() pages never overlap
+        def query():
+            q = (
+                client.table(table)
+                .select(",".join(columns))
+                .gte("date", start_date.isoformat())
+                .lte("date", end_date.isoformat())
+            )
+            for column in ("date", *key):
+                q = q.order(column, desc=False)
+            return q
+        return fetch_frame(query, columns)
+
+    payroll = rows(
+        PAYROLL_ROLLUP, ["employee_role_id", "name", "role", "date", "day_type", "daily_rate", "pay"],
+        "employee_role_id",
+    ).rename(columns={
+        "name": "Name", "role": "Role", "date": "Date", "day_type": "Day Type",
+        "daily_rate": "Daily Rate", "pay": "Daily Pay",
+    }).astype({"Daily Pay": float})
+
+    production = rows(
+        PRODUCTION_ROLLUP, ["date", "machine", "psa_number", "company", "footage", "labor_cost", "revenue", "log_count"],
+        "machine", "psa_number",
+    ).rename(columns={
+        "date": "Date", "machine": "Machine", "psa_number": "PSA Number", "company": "Company",
+        "footage": "Footage", "labor_cost": "Labor Cost", "revenue": "Revenue", "log_count": "Logs",
+    }).astype({"Footage": float, "Labor Cost": float, "Revenue": float})
+    production = production.assign(**{
+        "PSA Number": production["PSA Number"].replace("", None),
+        "Labor Cost per Foot": per_foot(production["Labor Cost"], production["Footage"]).round(2),
+        "Pay Rate": per_foot(production["Revenue"], production["Footage"]),
+        "Profit/Loss": production["Revenue"] - production["Labor Cost"],
+    })
+    production = typed(production, dates=["Date"], labels=["Machine", "PSA Number", "Company"], rates=["Pay Rate"])
+    return typed_payroll(payroll), production
+
+
+# ---------------------------
+# Worker
+# ---------------------------
+def client_from_secrets():
+    from supabase import create_client
+
+    url, key = os.environ.get("SUPABASE_URL"), os.environ.get("SUPABASE_KEY")
+    if not (url and key):
+        import toml
+
+        secrets = toml.load(SECRETS_PATH)
+        url, key = secrets["SUPABASE_URL"], secrets["SUPABASE_KEY"]
+    return create_client(url, key)
+
+
+def earliest_log_date(client):
+    dates = []
+    for table in ("daily_logs", "machine_logs"):
+        rows = client.table(table).select("date").order("date", desc=False).limit(1).execute().data or []
+        dates.extend(datetime.date.fromisoformat(r["date"]) for r in rows)
+    return min(dates) if dates else None
+
+
+def refresh(client, start_date, end_date, max_age_seconds=DEFAULT_MAX_AGE_SECONDS, force=False):
+    """
+    Recompute rollups for [start_date, end_date] if their inputs changed or they are older
+    than `max_age_seconds`. Returns a one-line summary of what happened.
+    """
+    state, available = load_rollup_state(client)
+    if not available:
+        raise SystemExit(ROLLUPS_HOWTO)
+
+    inputs = load_inputs(client, start_date, end_date)
+    digest = fingerprint(inputs)
+    if state and not force and state.get("fingerprint") == digest and rollups_cover(state, start_date, end_date):
+        computed_at = datetime.datetime.fromisoformat(state["computed_at"])
+        age = (datetime.datetime.now(datetime.timezone.utc) - computed_at).total_seconds()
+        if age < max_age_seconds:
+            return f"{start_date} → {end_date}: unchanged"
+
+    rollups = compute_rollups(inputs)
+    atomic = store_rollups(client, start_date, end_date, rollups, digest, inputs["rate_history"][1])
+    counts = ", ".join(f"{table}={len(rows)}" for table, rows in rollups.items())
+    note = "" if atomic else f"; swapped without {REPLACE_FUNCTION}(), see the setup SQL"
+    return f"{start_date} → {end_date}: recomputed ({counts}){note}"
+
+
+def rebuild_progress(client, end_date):
+    """
+    Recount psa_progress from every machine log up to `end_date`. The pages keep it
+    current incrementally; this repairs drift, e.g. from rate or roster edits.
+    """
+    if not progress_available(client):
+        raise SystemExit(PROGRESS_HOWTO)
+    start_date = earliest_log_date(client)
+    if start_date is None:
+        replace_progress(client, [])
+        return "psa_progress: no logs"
+    rows = progress_rows(priced_logs(load_inputs(client, start_date, end_date)))
+    replace_progress(client, rows)
+    return f"psa_progress: recounted {len(rows)} PSAs from {start_date} → {end_date}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute Financial Overview rollups.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--once", action="store_true", help="run a single refresh and exit (default)")
+    mode.add_argument("--interval", type=int, metavar="SECONDS", help="keep refreshing every SECONDS")
+    parser.add_argument("--days", type=int, default=DEFAULT_WINDOW_DAYS, help="trailing days to recompute")
+    parser.add_argument("--full", action="store_true", help="recompute every day since the first log")
+    parser.add_argument("--max-age", type=int, default=DEFAULT_MAX_AGE_SECONDS, metavar="SECONDS",
+                        help="recompute even without detected changes once rollups are this old")
+    parser.add_argument("--rebuild-progress", action="store_true",
+                        help="recount the per-PSA progress counters from every log first")
+    args = parser.parse_args(argv)
+
+    client = client_from_secrets()
+    if args.rebuild_progress:
+        print(rebuild_progress(client, datetime.datetime.now(LOCAL_TZ).date()), flush=True)
+    full = args.full
+    while True:
+        end_date = datetime.datetime.now(LOCAL_TZ).date()
+        start_date = end_date - datetime.timedelta(days=args.days - 1)
+        if full:
+            start_date = earliest_log_date(client) or start_date
+        try:
+            print(refresh(client, start_date, end_date, args.max_age, force=full), flush=True)
+        except SystemExit:
+            raise
+        except Exception as e:
+            if not args.interval:
+                raise
+            print(f"refresh failed: {e}", flush=True)
+        if not args.interval:
+            return
+        full = False  # a --full rebuild only needs to happen once
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
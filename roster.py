@@ -0,0 +1,124 @@
+import itertools
+from collections import defaultdict
+
+import streamlit as st
+
+DEFAULT_SORT_ORDER = 9999
+ROSTER_TTL_SECONDS = 300  # rebuild at least this often even without local edits
+
+_epochs = itertools.count(1)
+
+
+class RoleRecord:
+    """One employee_roles row (a name can hold several roles, each with its own rate)."""
+
+    __slots__ = ("id", "name", "role", "daily_rate", "sort_order")
+
+    def __init__(self, id, name, role, daily_rate, sort_order=DEFAULT_SORT_ORDER):
+        self.id = id
+        self.name = name
+        self.role = role
+        self.daily_rate = float(daily_rate or 0)
+        self.sort_order = sort_order
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(row["id"], row["name"], row["role"], row.get("daily_rate"), row["sort_order"])
+
+    @property
+    def label(self):
+        return f"{self.name} — {self.role} (id={self.id})"
+
+    def day_pay(self, day_type):
+        """Pay for one logged day: the full rate for "full", half otherwise."""
+        return self.daily_rate if day_type == "full" else self.daily_rate / 2
+
+
+class Roster:
+    """
+    Indexed view of employee_roles, built once per cache epoch and shared by every page.
+    Records are ordered by (sort_order, name); `names` is the person-level display order.
+    """
+
+    __slots__ = ("epoch", "records", "by_id", "by_name", "by_name_role", "name_sort_map", "names", "distinct_roles")
+
+    def __init__(self, records, epoch=0):
+        self.epoch = epoch
+        self.records = records
+        self.by_id = {r.id: r for r in records}
+        self.by_name = defaultdict(list)
+        self.by_name_role = {}
+        for r in records:
+            self.by_name[r.name].append(r)
+            self.by_name_role[(r.name, r.role)] = r
+        self.by_name = dict(self.by_name)
+        # each name sorts by the minimum sort_order across its roles
+        self.name_sort_map = {name: min(r.sort_order for r in rows) for name, rows in self.by_name.items()}
+        self.names = [name for name, _ in sorted(self.name_sort_map.items(), key=lambda x: x[1])]
+        self.distinct_roles = sorted(set(r.role for r in records))
+
+    def roles_for(self, name):
+        return [r.role for r in self.by_name.get(name, [])]
+
+    def primary_role(self, name):
+        """First role row for a name (lowest sort_order), or None."""
+        rows = self.by_name.get(name)
+        return rows[0] if rows else None
+
+    def sort_key(self, name, role=""):
+        """Sort key for display rows: person-level order, then name, then role."""
+        return (self.name_sort_map.get(name, DEFAULT_SORT_ORDER), name, role)
+
+    def next_sort_order(self):
+        """Return max(sort_order)+1, or 1 if empty."""
+        return (max(self.name_sort_map.values()) + 1) if self.name_sort_map else 1
+
+
+def fetch_employee_roles(client):
+    """Return rows from employee_roles with normalized sort_order and sane fallback ordering."""
+    rows = []
+    try:
+        rows = (
+            client.table("employee_roles")
+            .select("id,name,role,daily_rate,sort_order")
+            .order("sort_order", desc=False)
+            .execute()
+        ).data or []
+    except Exception:
+        try:
+            rows = (
+                client.table("employee_roles")
+                .select("id,name,role,daily_rate,sort_order")
+                .execute()
+            ).data or []
+        except Exception:
+            rows = (
+                client.table("employee_roles")
+                .select("id,name,role,daily_rate")
+                .execute()
+            ).data or []
+
+    return normalize_role_rows(rows)
+
+
+def normalize_role_rows(rows):
+    """Give every employee_roles row an int sort_order (NULL -> DEFAULT_SORT_ORDER), sorted by it then name."""
+    for r in rows:
+        try:
+            r["sort_order"] = int(r.get("sort_order")) if r.get("sort_order") is not None else DEFAULT_SORT_ORDER
+        except (TypeError, ValueError):
+            r["sort_order"] = DEFAULT_SORT_ORDER
+    rows.sort(key=lambda r: (r["sort_order"], r["name"]))
+    return rows
+
+
+@st.cache_resource(ttl=ROSTER_TTL_SECONDS, show_spinner=False)
+def load_roster(_client):
+    """The shared Roster for the current cache epoch (one copy for all sessions)."""
+    records = [RoleRecord.from_row(r) for r in fetch_employee_roles(_client)]
+    return Roster(records, epoch=next(_epochs))
+
+
+def invalidate_roster():
+    """Start a new cache epoch; call after any write to employee_roles."""
+    load_roster.clear()
@@ -0,0 +1,166 @@
+import datetime
+import time
+
+import pandas as pd
+import streamlit as st
+
+from changes import changes
+from contracts import load_rate_history
+from datasets import fetch_all, load_machine_logs
+from payroll import load_closed_periods
+
+STORE_KEY = "_session_store"
+DATASET_TTL_SECONDS = 300  # reload from scratch at least this often, for writes made elsewhere
+
+
+class StoredDataset:
+    """A loaded dataset plus the version stamp it was loaded at."""
+
+    __slots__ = ("data", "tables", "version", "stamp", "loaded_at", "start", "end")
+
+    def __init__(self, data, tables, stamp, start=None, end=None):
+        self.data = data
+        self.tables = tables
+        self.version = changes.version(tables)
+        self.stamp = stamp
+        self.loaded_at = time.monotonic()
+        self.start = start
+        self.end = end
+
+    def current(self, stamp):
+        """Still valid: same stamp, nothing written since, and not past the TTL."""
+        return (
+            self.stamp == stamp
+            and self.version == changes.version(self.tables)
+            and time.monotonic() - self.loaded_at < DATASET_TTL_SECONDS
+        )
+
+    def reusable(self, stamp):
+        return self.stamp == stamp and time.monotonic() - self.loaded_at < DATASET_TTL_SECONDS
+
+
+def _store():
+    """This session's store; it lives in session_state, so it survives page switches."""
+    return st.session_state.setdefault(STORE_KEY, {"values": {}, "datasets": {}})
+
+
+# ---------------------------
+# Working dates
+# ---------------------------
+def sticky_date_input(label, key, default, **kwargs):
+    """
+    st.date_input whose value is kept in the session store. Streamlit drops widget
+    state on reruns of pages that don't render the widget, so without this the date
+    resets whenever the user visits another page.
+    """
+    values = _store()["values"]
+    if key not in st.session_state:
+        st.session_state[key] = values.get(key, default)
+    value = st.date_input(label, key=key, **kwargs)
+    values[key] = value
+    return value
+
+
+# ---------------------------
+# Datasets
+# ---------------------------
+def session_dataset(name, tables, load, stamp=None):
+    """
+    `load()` once per session, reused on every page until one of `tables` is written
+    (see changes.ChangeRegistry), `stamp` changes or DATASET_TTL_SECONDS pass.
+    """
+    datasets = _store()["datasets"]
+    entry = datasets.get(name)
+    if entry is None or not entry.current(stamp):
+        entry = datasets[name] = StoredDataset(load(), tables, stamp)
+    return entry.data
+
+
+def _between(frame, column, start, end):
+    dates = frame[column]
+    return frame[(dates >= pd.Timestamp(start)) & (dates <= pd.Timestamp(end))]
+
+
+def _concat(frames):
+    """Concatenate same-shaped frames, keeping categorical columns categorical."""
+    frames = [f for f in frames if not f.empty] or frames[:1]
+    frame = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    labels = [c for c, dtype in frames[0].dtypes.items() if isinstance(dtype, pd.CategoricalDtype)]
+    return frame.astype({c: "category" for c in labels})
+
+
+def session_date_dataset(name, tables, start, end, fetch, date_column, stamp=None):
+    """
+    Rows of a date-keyed dataset for [start, end], where `fetch(start, end)` returns a
+    frame with a datetime64 `date_column`. The session keeps one contiguous span:
+    - unchanged and already covered: served from the store, no request;
+    - widened or slid: only the days not held yet are fetched;
+    - after writes to `tables`: only the dates those writes touched are fetched again.
+    Anything else (other stamp, far-away range, untracked writes, TTL) loads from scratch.
+    """
+    datasets = _store()["datasets"]
+    entry = datasets.get(name)
+    one_day = datetime.timedelta(days=1)
+
+    if entry is None or not entry.reusable(stamp) or start > entry.end + one_day or end < entry.start - one_day:
+        entry = datasets[name] = StoredDataset(fetch(start, end), tables, stamp, start, end)
+        return entry.data
+
+    frame = entry.data
+    latest = changes.version(tables)
+    if entry.version != latest:
+        touched = changes.changed_dates(tables, entry.version)
+        if touched is None:
+            entry = datasets[name] = StoredDataset(fetch(start, end), tables, stamp, start, end)
+            return entry.data
+        touched = sorted(d for d in touched if entry.start.isoformat() <= d <= entry.end.isoformat())
+        if touched:
+            first, last = datetime.date.fromisoformat(touched[0]), datetime.date.fromisoformat(touched[-1])
+            kept = frame[~frame.index.isin(_between(frame, date_column, first, last).index)]
+            frame = _concat([kept, fetch(first, last)])
+        entry.version = latest
+
+    if start < entry.start:
+        frame = _concat([fetch(start, entry.start - one_day), frame])
+        entry.start = start
+    if end > entry.end:
+        frame = _concat([frame, fetch(entry.end + one_day, end)])
+        entry.end = end
+    entry.data = frame
+    return _between(frame, date_column, start, end).reset_index(drop=True)
+
+
+# ---------------------------
+# Lookups shared by several pages
+# ---------------------------
+def session_machines(client):
+    return session_dataset(
+        "machines", ("machines",), lambda: client.table("machines").select("id,name").execute().data or []
+    )
+
+
+def session_psa_rates(client):
+    return session_dataset(
+        "psa_rates", ("psa_rates",),
+        lambda: fetch_all(
+            lambda: client.table("psa_rates").select("psa_number,company_name,pay_rate").order("psa_number")
+        ),
+    )
+
+
+def session_rate_history(client):
+    """(history, available), as contracts.load_rate_history returns them."""
+    return session_dataset("rate_history", ("psa_rate_history",), lambda: load_rate_history(client))
+
+
+def session_machine_logs(client, start_date, end_date):
+    """datasets.load_machine_logs for [start_date, end_date], held as a session date dataset."""
+    return session_date_dataset(
+        "machine_logs", ("machine_logs",), start_date, end_date,
+        lambda s, e: load_machine_logs(client, s, e), "date",
+    )
+
+
+def session_closed_periods(client):
+    """(periods, available), as payroll.load_closed_periods returns them."""
+    return session_dataset("closed_periods", ("payroll_periods",), lambda: load_closed_periods(client))
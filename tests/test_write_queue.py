@@ -0,0 +1,145 @@
+import os
+
+import streamlit as st
+import supabase
+from streamlit.testing.v1 import AppTest
+
+import write_queue
+from fake_backend import FakeBackend
+from write_queue import DAILY_LOGS, MACHINE_LOG, WriteQueue, flush_once
+
+DAILY_TRACKER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Daily Tracker.py")
+
+
+def day_log(day_type):
+    return [{"employee_role_id": 1, "date": "2026-10-01", "day_type": day_type}]
+
+
+def test_replayed_submission_is_queued_once(tmp_path):
+    queue = WriteQueue(str(tmp_path / "queue.sqlite3"))
+    key = f"{DAILY_LOGS}:today_logs_form:abc"
+    assert queue.enqueue(DAILY_LOGS, day_log("full"), key=key)
+    assert not queue.enqueue(DAILY_LOGS, day_log("full"), key=key)
+    assert queue.pending_dates() == {"2026-10-01"}
+
+
+def test_saving_a_day_back_to_earlier_values_syncs_the_last_save(tmp_path, monkeypatch):
+    # offline: full, then half, then full again; the flush must write full
+    queue = WriteQueue(str(tmp_path / "queue.sqlite3"))
+    backend = FakeBackend({
+        "employee_roles": [{"id": 1, "name": "Ana", "role": "Laborer", "daily_rate": 200.0, "sort_order": 1}],
+        "daily_logs": [],
+    })
+    monkeypatch.setattr(supabase, "create_client", lambda *args, **kwargs: backend.client())
+    monkeypatch.setattr(write_queue, "get_write_queue", lambda client: queue)
+    st.cache_resource.clear()
+
+    app = AppTest.from_file(DAILY_TRACKER, default_timeout=30)
+    app.secrets["SUPABASE_URL"] = "http://fake"
+    app.secrets["SUPABASE_KEY"] = "key"
+    app.run()
+    for day_type in ["full", "half", "full"]:
+        app.radio(key="Ana_daytype").set_value(day_type)
+        next(b for b in app.button if b.label == "✅ Save Today's Logs").click()
+        app.run()
+        assert not app.exception
+        assert app.success[0].value.startswith("✅ 1 logs saved")
+
+    assert queue.stats()[0] == 3
+    flush_once(queue, backend.client())
+    assert [r["day_type"] for r in backend.tables["daily_logs"]] == ["full"]
+
+
+def production_backend():
+    return FakeBackend({
+        "employee_roles": [{"id": 1, "name": "Ana", "role": "Operator", "daily_rate": 200.0, "sort_order": 1}],
+        "daily_logs": [{"id": 1, "employee_role_id": 1, "date": "2026-10-01", "day_type": "full"}],
+        "psa_rates": [{"psa_number": "PSA1", "company_name": "Acme", "pay_rate": 2.0}],
+        "psa_rate_history": [],
+        "machine_logs": [],
+        "machine_employees": [],
+        "psa_progress": [],
+    })
+
+
+def production_log():
+    return {"log": {"machine_id": 1, "date": "2026-10-01", "footage": 100, "psa_number": "PSA1"}, "crew": [1]}
+
+
+def test_replaying_a_production_submission_counts_it_once(tmp_path):
+    # the same form submission replayed after its queue row was already flushed
+    backend = production_backend()
+    key = f"{MACHINE_LOG}:machine_production_form:abc"
+    for n in range(2):
+        queue = WriteQueue(str(tmp_path / f"queue{n}.sqlite3"))
+        queue.enqueue(MACHINE_LOG, production_log(), key=key)
+        assert flush_once(queue, backend.client()) == 1
+
+    assert len(backend.tables["machine_logs"]) == 1
+    assert len(backend.tables["machine_employees"]) == 1
+    [progress] = backend.tables["psa_progress"]
+    assert (progress["footage"], progress["revenue"], progress["labor_cost"], progress["log_count"]) == (
+        100, 200.0, 200.0, 1
+    )
+
+
+def test_two_identical_production_submissions_are_both_saved(tmp_path):
+    backend = production_backend()
+    queue = WriteQueue(str(tmp_path / "queue.sqlite3"))
+    assert queue.enqueue(MACHINE_LOG, production_log(), key=f"{MACHINE_LOG}:machine_production_form:1")
+    assert queue.enqueue(MACHINE_LOG, production_log(), key=f"{MACHINE_LOG}:machine_production_form:2")
+    assert flush_once(queue, backend.client()) == 2
+
+    assert len(backend.tables["machine_logs"]) == 2
+    [progress] = backend.tables["psa_progress"]
+    assert (progress["footage"], progress["log_count"]) == (200, 2)
+
+
+def test_crew_days_entered_after_the_log_reprice_its_labor(tmp_path):
+    backend = production_backend()
+    backend.tables["daily_logs"] = []
+    queue = WriteQueue(str(tmp_path / "queue.sqlite3"))
+    queue.enqueue(MACHINE_LOG, production_log(), key=f"{MACHINE_LOG}:machine_production_form:1")
+    queue.enqueue(DAILY_LOGS, day_log("full"), key=f"{DAILY_LOGS}:today_logs_form:1")
+    queue.enqueue(DAILY_LOGS, day_log("half"), key=f"{DAILY_LOGS}:today_logs_form:2")
+    flush_once(queue, backend.client())
+    assert backend.tables["psa_progress"][0]["labor_cost"] == 100.0
+
+    queue.enqueue(DAILY_LOGS, day_log("full"), key=f"{DAILY_LOGS}:today_logs_form:3")
+    flush_once(queue, backend.client())
+    assert backend.tables["psa_progress"][0]["labor_cost"] == 200.0
+
+
+def test_crew_without_sort_order_is_still_priced(tmp_path):
+    write_queue.schema_warnings.clear()
+    backend = production_backend()
+    backend.tables["employee_roles"] = [
+        {"id": 1, "name": "Ana", "role": "Operator", "daily_rate": 200.0, "sort_order": None},
+        {"id": 2, "name": "Bo", "role": "Laborer", "daily_rate": 100.0, "sort_order": None},
+    ]
+    backend.tables["daily_logs"].append({"id": 2, "employee_role_id": 2, "date": "2026-10-01", "day_type": "full"})
+    queue = WriteQueue(str(tmp_path / "queue.sqlite3"))
+    queue.enqueue(MACHINE_LOG, {**production_log(), "crew": [1, 2]}, key=f"{MACHINE_LOG}:machine_production_form:1")
+    flush_once(queue, backend.client())
+
+    assert not write_queue.schema_warnings
+    assert backend.tables["psa_progress"][0]["labor_cost"] == 300.0
+
+
+def test_logs_saved_before_a_failed_crew_insert_are_counted_once(tmp_path):
+    backend = production_backend()
+    backend.missing.add("machine_employees")
+    queue = WriteQueue(str(tmp_path / "queue.sqlite3"))
+    for n in range(2):
+        queue.enqueue(MACHINE_LOG, production_log(), key=f"{MACHINE_LOG}:machine_production_form:{n}")
+    assert flush_once(queue, backend.client()) == 0
+
+    backend.missing.discard("machine_employees")
+    with queue._connect() as conn:  # skip the retry backoff
+        conn.execute("UPDATE pending_writes SET next_attempt_at = 0")
+    assert flush_once(queue, backend.client()) == 2
+
+    assert len(backend.tables["machine_logs"]) == 2
+    assert len(backend.tables["machine_employees"]) == 2
+    [progress] = backend.tables["psa_progress"]
+    assert (progress["footage"], progress["log_count"]) == (200, 2)
@@ -0,0 +1,349 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import httpx
+import streamlit as st
+from postgrest.exceptions import APIError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
+
+from changes import changes
+from daily_logs import upsert_daily_logs_in_chunks
+from datasets import IN_FILTER_BATCH
+from photos import link_photos
+from progress import PROGRESS_HOWTO, load_crew_days, record_crew_days, record_new_logs
+
+QUEUE_PATH = os.environ.get(
+    "WRITE_QUEUE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".write_queue.sqlite3"),
+)
+FLUSH_INTERVAL_SECONDS = 5
+FLUSH_BATCH_SIZE = 200  # queued submissions coalesced per flush
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 300
+
+# Submission kinds
+DAILY_LOGS = "daily_logs"  # payload: list of daily_logs rows
+MACHINE_LOG = "machine_log"  # payload: {"log": machine_logs row, "crew": [employee_role_id, ...]}
+
+# missing client_key column, or no unique constraint to upsert against
+NOT_IDEMPOTENT_CODES = ("42703", "PGRST204", "42P10")
+IDEMPOTENT_MACHINE_LOGS_HOWTO = (
+    "Queued production logs are deduplicated with a client_key column:\n"
+    "  ALTER TABLE machine_logs ADD COLUMN client_key text UNIQUE;\n"
+    "  ALTER TABLE machine_employees ADD UNIQUE (machine_log_id, employee_role_id);\n"
+    "Until then, queued logs are inserted without deduplication."
+)
+
+PROGRESS_MISSED = (
+    "PSA progress counters missed an update ({}); "
+    "run `python rollups.py --once --rebuild-progress` to recount them."
+)
+
+# schema fallbacks the flusher had to use, shown by render_sync_status
+schema_warnings = set()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pending_writes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at REAL NOT NULL
+)
+"""
+
+# Transport failures are retried in-flush; anything else waits for the next backoff slot.
+transient_retry = retry(
+    retry=retry_if_exception_type((httpx.TransportError, ConnectionError, TimeoutError)),
+    stop=stop_after_attempt(3),
+    wait=wait_exponential(multiplier=0.5, max=8),
+    reraise=True,
+)
+
+
+def idempotency_key(kind, payload):
+    """
+    Stable key from content, for imported rows: re-importing a file maps to the same keys.
+    Form entries use submission_key(), since two identical entries can both be real.
+    """
+    body = json.dumps(payload, sort_keys=True, default=str)
+    return f"{kind}:{hashlib.sha256(body.encode()).hexdigest()}"
+
+
+def submission_key(kind, form):
+    """
+    Key for the current submission of a Streamlit form, for writes where the last one
+    must win (content keys would drop a return to earlier values: A, B, A syncs B).
+    Replays of the same submission share the key; next_submission() starts a new one.
+    """
+    nonce = st.session_state.setdefault(f"_submission_{form}", uuid.uuid4().hex)
+    return f"{kind}:{form}:{nonce}"
+
+
+def next_submission(form):
+    st.session_state.pop(f"_submission_{form}", None)
+
+
+class WriteQueue:
+    """Durable SQLite queue of submissions waiting to be written to Supabase."""
+
+    def __init__(self, path=QUEUE_PATH):
+        self.path = path
+        self.wake = threading.Event()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+
+    def _connect(self):
+        # one short-lived connection per call: the flusher and script threads never share one
+        return sqlite3.connect(self.path, timeout=30)
+
+    def enqueue(self, kind, payload, key=None):
+        """
+        Record a submission; returns False if the same idempotency key is already queued.
+        Wakes the flusher so the write usually lands within a second when online.
+        """
+        key = key or idempotency_key(kind, payload)
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO pending_writes (idempotency_key, kind, payload, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, kind, json.dumps(payload, default=str), time.time()),
+            )
+        self.wake.set()
+        return cur.rowcount == 1
+
+    def ready(self, limit=FLUSH_BATCH_SIZE):
+        """Submissions whose backoff has elapsed, oldest first, as (id, key, kind, payload)."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, idempotency_key, kind, payload FROM pending_writes "
+                "WHERE next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+        return [(i, key, kind, json.loads(payload)) for i, key, kind, payload in rows]
+
+    def mark_done(self, ids):
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM pending_writes WHERE id = ?", [(i,) for i in ids])
+
+    def mark_failed(self, ids, error):
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE pending_writes SET attempts = attempts + 1, last_error = ?, "
+                "next_attempt_at = ? + MIN(?, ? * (1 << MIN(attempts, 10))) WHERE id = ?",
+                [(str(error)[:500], now, RETRY_MAX_SECONDS, RETRY_BASE_SECONDS, i) for i in ids],
+            )
+
+    def pending_dates(self):
+        """ISO dates of the daily_logs rows still waiting in the queue."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT payload FROM pending_writes WHERE kind = ?", (DAILY_LOGS,)).fetchall()
+        return {row["date"] for (payload,) in rows for row in json.loads(payload)}
+
+    def stats(self):
+        """(pending count, failed-at-least-once count, most recent error or None)."""
+        with self._connect() as conn:
+            pending, failed = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(attempts > 0), 0) FROM pending_writes"
+            ).fetchone()
+            last = conn.execute(
+                "SELECT last_error FROM pending_writes WHERE last_error IS NOT NULL "
+                "ORDER BY next_attempt_at DESC LIMIT 1"
+            ).fetchone()
+        return pending, failed, (last[0] if last else None)
+
+
+# ---------------------------
+# Flushing
+# ---------------------------
+def count_progress(record, *args):
+    """
+    Apply a progress.record_* update. The rows it counts are saved by now, so a failure
+    here must not fail the write (a retry would count them twice); a rebuild repairs it.
+    """
+    try:
+        if not record(*args):
+            schema_warnings.add(PROGRESS_HOWTO)
+    except Exception as e:
+        schema_warnings.add(PROGRESS_MISSED.format(e))
+
+
+def save_daily_logs(client, rows):
+    """
+    upsert_daily_logs_in_chunks, then move the labor of production logs already counted
+    in psa_progress by the pay change of each worker-day written. Same return value.
+    """
+    try:
+        before = load_crew_days(client, rows)
+    except Exception as e:
+        before = None
+        schema_warnings.add(PROGRESS_MISSED.format(e))
+    written, errinfo = transient_retry(upsert_daily_logs_in_chunks)(client, rows)
+    if before is not None and written:
+        days = {(r["employee_role_id"], r["date"]) for r in rows[:written]}
+        before = [r for r in before if (r["employee_role_id"], r["date"]) in days]
+        count_progress(record_crew_days, client, before, rows[:written])
+    return written, errinfo
+
+
+def flush_daily_logs(client, items):
+    """Coalesce queued daily_logs rows into chunked bulk upserts (last write per key wins)."""
+    rows = {}
+    for _, _, _, payload in items:
+        for row in payload:
+            rows[(row["employee_role_id"], row["date"])] = row
+    written, errinfo = save_daily_logs(client, list(rows.values()))
+    if errinfo:
+        shown = errinfo["shown"]
+        raise RuntimeError(errinfo.get("howto") or shown.get("message") or str(shown))
+
+
+@transient_retry
+def insert_machine_logs(client, logs):
+    """
+    Insert machine_logs rows idempotently. Returns ({client_key: id}, keys inserted now):
+    a key already saved (a re-import, a resubmit, a retried flush) maps to its
+    existing row but isn't new.
+    """
+    try:
+        # ignore_duplicates returns only the rows this request inserted
+        inserted = client.table("machine_logs").upsert(
+            logs, on_conflict="client_key", ignore_duplicates=True
+        ).execute().data or []
+    except APIError as e:
+        if getattr(e, "code", None) not in NOT_IDEMPOTENT_CODES:
+            raise
+        # No unique client_key column yet: plain insert, one row at a time to keep the id mapping
+        schema_warnings.add(IDEMPOTENT_MACHINE_LOGS_HOWTO)
+        ids = {}
+        for log in logs:
+            key = log["client_key"]
+            row = {k: v for k, v in log.items() if k != "client_key"}
+            ids[key] = client.table("machine_logs").insert(row).execute().data[0]["id"]
+        return ids, set(ids)
+
+    ids = {r["client_key"]: r["id"] for r in inserted}
+    saved_before = [log["client_key"] for log in logs if log["client_key"] not in ids]
+    for start in range(0, len(saved_before), IN_FILTER_BATCH):
+        rows = client.table("machine_logs").select("client_key,id").in_(
+            "client_key", saved_before[start:start + IN_FILTER_BATCH]
+        ).execute().data or []
+        ids.update((r["client_key"], r["id"]) for r in rows)
+    return ids, {r["client_key"] for r in inserted}
+
+
+@transient_retry
+def insert_machine_crew(client, crew_rows):
+    try:
+        client.table("machine_employees").upsert(
+            crew_rows, on_conflict="machine_log_id,employee_role_id", ignore_duplicates=True
+        ).execute()
+    except APIError as e:
+        if getattr(e, "code", None) not in NOT_IDEMPOTENT_CODES:
+            raise
+        schema_warnings.add(IDEMPOTENT_MACHINE_LOGS_HOWTO)
+        client.table("machine_employees").insert(crew_rows).execute()
+
+
+def flush_machine_logs(client, items):
+    """Batch-insert queued production logs, then all their crew rows in one request."""
+    logs = [{**payload["log"], "client_key": key} for _, key, _, payload in items]
+    # bulk requests need the same keys on every row (e.g. operation_type is only set for fiber pulling)
+    columns = sorted(set().union(*logs))
+    logs = [{c: log.get(c) for c in columns} for log in logs]
+    ids, new_keys = insert_machine_logs(client, logs)
+    dates = {log["date"] for log in logs}
+    changes.bump("machine_logs", dates)
+    crew_rows = [
+        {"machine_log_id": ids[key], "employee_role_id": role_id}
+        for _, key, _, payload in items
+        for role_id in payload["crew"]
+        if key in ids
+    ]
+    # Running per-contract totals, for logs this flush actually created. Counted before
+    # anything else can fail: a retry finds these logs already saved and skips them.
+    saved = [{**log, "id": ids[log["client_key"]]} for log in logs if log["client_key"] in new_keys]
+    saved_ids = {log["id"] for log in saved}
+    count_progress(record_new_logs, client, saved, [row for row in crew_rows if row["machine_log_id"] in saved_ids])
+
+    if crew_rows:
+        insert_machine_crew(client, crew_rows)
+        changes.bump("machine_employees", dates)
+    # photos are uploaded before their log is queued, so they can be linked now
+    link_photos(client, ids)
+
+
+FLUSHERS = {DAILY_LOGS: flush_daily_logs, MACHINE_LOG: flush_machine_logs}
+
+
+def flush_once(queue, client):
+    """Write every ready submission, one batch per kind. Returns the number written."""
+    by_kind = {}
+    for item in queue.ready():
+        by_kind.setdefault(item[2], []).append(item)
+
+    written = 0
+    for kind, items in by_kind.items():
+        try:
+            FLUSHERS[kind](client, items)
+        except Exception as e:
+            if len(items) == 1:
+                # keep it queued; it is retried after a backoff
+                queue.mark_failed([items[0][0]], e)
+                continue
+            # one bad submission shouldn't hold back the rest: retry them one by one
+            for item in items:
+                try:
+                    FLUSHERS[kind](client, [item])
+                except Exception as item_error:
+                    queue.mark_failed([item[0]], item_error)
+                else:
+                    queue.mark_done([item[0]])
+                    written += 1
+            continue
+        queue.mark_done([item[0] for item in items])
+        written += len(items)
+    return written
+
+
+def run_flusher(queue, client):
+    while True:
+        queue.wake.wait(FLUSH_INTERVAL_SECONDS)
+        queue.wake.clear()
+        try:
+            flush_once(queue, client)
+        except Exception:
+            pass  # e.g. the SQLite file is briefly locked; try again next tick
+
+
+@st.cache_resource(show_spinner=False)
+def get_write_queue(_client):
+    """The process-wide queue, with its background flusher thread started once."""
+    queue = WriteQueue()
+    threading.Thread(target=run_flusher, args=(queue, _client), name="write-queue-flusher", daemon=True).start()
+    return queue
+
+
+def render_sync_status(queue):
+    """Small status line: how many submissions are still waiting to sync."""
+    for howto in schema_warnings:
+        st.caption(howto)
+    pending, failed, last_error = queue.stats()
+    if not pending:
+        return
+    if failed:
+        st.warning(f"📶 {pending} submission(s) waiting to sync; retrying in the background.")
+        if last_error:
+            st.caption(f"Last error: {last_error}")
+    else:
+        st.caption(f"🔄 {pending} submission(s) syncing…")